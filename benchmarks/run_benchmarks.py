@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Stage-level benchmarks for WebtoonProcessor
+
+Generates a synthetic chapter (or uses the bundled Mercenary Enrollment
+slices), serves it from a local HTTP server with optional latency and
+errors, and runs every processing stage in its own process, recording wall
+time, CPU time and peak RSS. Results are written as JSON and can be compared
+with the results of another commit:
+
+    python benchmarks/run_benchmarks.py --output before.json
+    git checkout my-branch
+    python benchmarks/run_benchmarks.py --output after.json --compare before.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+BENCHMARK_FOLDER = os.path.dirname(os.path.abspath(__file__))
+REPO_FOLDER = os.path.dirname(BENCHMARK_FOLDER)
+sys.path.insert(0, REPO_FOLDER)
+
+from metrics import current_rss_bytes, peak_rss_bytes, reset_peak_rss  # noqa: E402
+from server import ChapterServer  # noqa: E402
+from synthetic import generate_chapter  # noqa: E402
+
+MERCENARY_FOLDER = os.path.join(REPO_FOLDER, "Webtoons", "Mercenary_Enrollment", "FormattedPNGs", "Chapter0")
+CHAPTER = "0"
+
+
+# Stages, in the order they run; each reads the files the previous ones wrote
+def stage_download(processor, context):
+    processor.download_images(context['base_url'], CHAPTER, context['start_num'])
+
+def stage_merge_pdf(processor, context):
+    processor.merge_png_to_pdf(os.path.join(processor.raw_folder, f"Chapter{CHAPTER}"), CHAPTER)
+
+def stage_pdf_to_long_image(processor, context):
+    processor.pdf_to_long_image(os.path.join(processor.pdf_folder, f"Chapter{CHAPTER}_Merged.pdf"), CHAPTER)
+
+def stage_images_to_long_image(processor, context):
+    processor.images_to_long_image(os.path.join(processor.raw_folder, f"Chapter{CHAPTER}"), CHAPTER)
+
+def stage_format_png_cold(processor, context):
+    long_image_path = os.path.join(processor.long_png_folder, f"Chapter{CHAPTER}_Merged.png")
+    gutter_index_path = processor.gutter_index_path(long_image_path)
+    if os.path.exists(gutter_index_path):
+        os.remove(gutter_index_path)
+    processor.format_png(long_image_path, CHAPTER)
+
+def stage_format_png_warm(processor, context):
+    processor.format_png(os.path.join(processor.long_png_folder, f"Chapter{CHAPTER}_Merged.png"), CHAPTER)
+
+def stage_format_images(processor, context):
+    processor.format_images(os.path.join(processor.raw_folder, f"Chapter{CHAPTER}"), CHAPTER)
+
+def stage_final_pdf(processor, context):
+    processor.formatted_pngs_to_pdf(os.path.join(processor.formatted_png_folder, f"Chapter{CHAPTER}"), CHAPTER)
+
+def stage_pipeline(processor, context):
+    shutil.rmtree(os.path.join(processor.raw_folder, f"Chapter{CHAPTER}"), ignore_errors=True)
+    processor.run_pipeline(context['base_url'], CHAPTER, context['start_num'])
+
+STAGES = {
+    'download': stage_download,
+    'merge_pdf': stage_merge_pdf,
+    'pdf_to_long_image': stage_pdf_to_long_image,
+    'images_to_long_image': stage_images_to_long_image,
+    'format_png_cold': stage_format_png_cold,
+    'format_png_warm': stage_format_png_warm,
+    'format_images': stage_format_images,
+    'final_pdf': stage_final_pdf,
+    'pipeline': stage_pipeline,
+}
+
+
+def run_stage(name, context):
+    """
+    Run one stage in this (fresh) process and measure it.
+
+    The stage's memory is the peak RSS while it ran minus the RSS before it
+    started. Measuring it needs a peak that can be reset (Linux); elsewhere
+    the peak of the whole process is reported and the stage's share is None.
+    
+    Returns:
+        Dictionary with wall and CPU seconds, peak, baseline and stage RSS in
+        MiB and the processor's counters (bytes downloaded, images decoded, ...)
+    """
+    import logging
+    from webtoon_processor import WebtoonProcessor
+
+    # Keep the processor's progress messages out of the results table
+    logging.getLogger().setLevel(logging.WARNING)
+    processor = WebtoonProcessor(context['work_folder'], **context['processor_options'])
+    baseline_rss = current_rss_bytes()
+    measured = reset_peak_rss()
+
+    wall_started, cpu_started = time.perf_counter(), time.process_time()
+    STAGES[name](processor, context)
+    wall, cpu = time.perf_counter() - wall_started, time.process_time() - cpu_started
+
+    peak_rss = peak_rss_bytes()
+    to_mib = (lambda value: None if value is None else round(value / 1024 ** 2, 1))
+    stage_rss = peak_rss - baseline_rss if measured and None not in (peak_rss, baseline_rss) else None
+    return {'stage': name, 'wall_s': round(wall, 3), 'cpu_s': round(cpu, 3),
+            'peak_rss_mib': to_mib(peak_rss), 'baseline_rss_mib': to_mib(baseline_rss),
+            'stage_rss_mib': to_mib(stage_rss), 'counters': dict(processor.metrics.counters)}
+
+
+def git_commit():
+    """Commit the benchmarks ran against, or None outside a git checkout."""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_FOLDER,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    """Print the change of every stage against an earlier results file."""
+    earlier = {stage['stage']: stage for stage in baseline['stages']}
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'}:")
+    print(f"{'stage':<22}{'wall s':>10}{'change':>9}{'cpu s':>10}{'change':>9}{'+rss MiB':>10}{'change':>9}")
+    for stage in results['stages']:
+        before = earlier.get(stage['stage'])
+        if before is None:
+            continue
+        row = f"{stage['stage']:<22}"
+        for key in ('wall_s', 'cpu_s', 'stage_rss_mib'):
+            value, old = stage[key], before.get(key)
+            change = f"{(value - old) / old:+.0%}" if value is not None and old else "n/a"
+            row += f"{value if value is not None else 'n/a':>10}{change:>9}"
+        print(row)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Stage-level benchmarks for WebtoonProcessor")
+    parser.add_argument('--fixture', choices=('synthetic', 'mercenary'), default='synthetic',
+                        help="Synthetic chapter or the bundled Mercenary Enrollment slices")
+    parser.add_argument('--pages', type=int, default=40, help="Synthetic pages")
+    parser.add_argument('--width', type=int, default=800, help="Synthetic page width")
+    parser.add_argument('--min-height', type=int, default=1200, help="Smallest synthetic page height")
+    parser.add_argument('--max-height', type=int, default=2400, help="Largest synthetic page height")
+    parser.add_argument('--gutters', type=int, default=2, help="Gutters per synthetic page")
+    parser.add_argument('--noise', type=float, default=0.2, help="Noise in synthetic panels, 0-1")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed")
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Random extra seconds per response")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of requests answered with 503")
+    parser.add_argument('--concurrency', type=int, default=8, help="max_concurrency of the processor")
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES),
+                        help="Stages to run (later stages need the files of earlier ones)")
+    parser.add_argument('--output', default=None, help="Results JSON (default: print only)")
+    parser.add_argument('--compare', default=None, help="Earlier results JSON to compare with")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    temp_folder = tempfile.mkdtemp(prefix="webtoon_bench_")
+
+    try:
+        if args.fixture == 'mercenary':
+            serve_folder, url_pattern, start_num = MERCENARY_FOLDER, "slice_XXX.png", "000"
+            fixture = {'name': 'mercenary', 'pages': len(os.listdir(MERCENARY_FOLDER))}
+        else:
+            serve_folder = os.path.join(temp_folder, "serve")
+            print(f"Generating {args.pages} synthetic pages...")
+            generate_chapter(serve_folder, args.pages, args.width, args.min_height, args.max_height,
+                             args.gutters, args.noise, args.seed)
+            url_pattern, start_num = "0000-XXX.png", "001"
+            fixture = {'name': 'synthetic', 'pages': args.pages, 'width': args.width,
+                       'min_height': args.min_height, 'max_height': args.max_height,
+                       'gutters': args.gutters, 'noise': args.noise, 'seed': args.seed}
+
+        results = {
+            'commit': git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'fixture': fixture,
+            'server': {'latency': args.latency, 'jitter': args.jitter, 'error_rate': args.error_rate},
+            'stages': [],
+        }
+
+        with ChapterServer(serve_folder, args.latency, args.jitter, args.error_rate, args.seed) as server:
+            context = {
+                'base_url': server.base_url + url_pattern,
+                'start_num': start_num,
+                'work_folder': os.path.join(temp_folder, "work"),
+                'processor_options': {'max_concurrency': args.concurrency},
+            }
+            for name in args.stages:
+                # A fresh process per stage, so stages do not share caches or leftover memory
+                with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+                    stage = executor.submit(run_stage, name, context).result()
+                results['stages'].append(stage)
+                print(f"{name:<22} wall {stage['wall_s']:>8.2f}s  cpu {stage['cpu_s']:>8.2f}s  "
+                      f"RSS +{stage['stage_rss_mib']} MiB (peak {stage['peak_rss_mib']} MiB)")
+            results['server']['stats'] = dict(server.stats)
+    finally:
+        shutil.rmtree(temp_folder, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=1)
+        print(f"Results saved at {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as file:
+            compare(results, json.load(file))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Local HTTP stand-in for a webtoon image host, with injectable latency and errors
+"""
+import functools
+import os
+import random
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _ChapterRequestHandler(SimpleHTTPRequestHandler):
+    def __init__(self, *args, chapter_server=None, **kwargs):
+        self.chapter_server = chapter_server
+        super().__init__(*args, **kwargs)
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_head(self):
+        server = self.chapter_server
+        server.count('requests')
+
+        delay = server.latency + server.jitter * server.random()
+        if delay:
+            time.sleep(delay)
+
+        if server.random() < server.error_rate:
+            server.count('errors')
+            self.send_error(503, "Injected error")
+            return None
+
+        response = super().send_head()
+        if response is not None and hasattr(response, 'fileno'):
+            server.count('bytes', os.fstat(response.fileno()).st_size)
+        return response
+
+
+class ChapterServer:
+    def __init__(self, directory, latency=0.0, jitter=0.0, error_rate=0.0, seed=0):
+        """
+        Serve a folder of chapter images over HTTP on a free local port.
+
+        Args:
+            directory: Folder served as the web root
+            latency: Seconds added to every response
+            jitter: Up to this many extra seconds, drawn at random per response
+            error_rate: Share of requests answered with 503 Service Unavailable (0-1)
+            seed: Random seed for jitter and errors
+        """
+        self.directory = directory
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.stats = {'requests': 0, 'errors': 0, 'bytes': 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def random(self):
+        with self._lock:
+            return self._random.random()
+
+    def count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    @property
+    def base_url(self):
+        """URL of the web root, e.g. http://127.0.0.1:12345/"""
+        return f"http://127.0.0.1:{self._server.server_port}/"
+
+    def start(self):
+        handler = functools.partial(_ChapterRequestHandler, directory=self.directory, chapter_server=self)
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="chapter-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
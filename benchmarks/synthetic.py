@@ -0,0 +1,80 @@
+"""
+Synthetic webtoon chapters for benchmarks
+"""
+import os
+import random
+
+import numpy as np
+from PIL import Image
+
+
+def generate_page(width, height, gutters=2, noise=0.2, rng=None):
+    """
+    Generate one page: panels of smooth colour gradients with noise, separated
+    by white or black gutters.
+
+    Args:
+        width: Page width in pixels
+        height: Page height in pixels
+        gutters: Number of gutters on the page
+        noise: Amount of random noise in the panels, 0 (flat art) to 1 (pure noise),
+            which controls how well the pages compress
+        rng: numpy Generator to draw from (default: a fresh one)
+
+    Returns:
+        RGB PIL image
+    """
+    rng = rng or np.random.default_rng()
+    pixels = np.empty((height, width, 3), dtype=np.uint8)
+
+    # Panels are split by gutters at random rows
+    cuts = sorted(rng.integers(1, height, size=gutters)) if gutters and height > 1 else []
+    bounds = [0] + list(cuts) + [height]
+    for top, bottom in zip(bounds[:-1], bounds[1:]):
+        rows = bottom - top
+        start, end = rng.integers(0, 256, size=3), rng.integers(0, 256, size=3)
+        ramp = np.linspace(0.0, 1.0, rows, dtype=np.float32)[:, None, None]
+        panel = start + (end.astype(np.float32) - start) * ramp
+        panel = np.broadcast_to(panel, (rows, width, 3)).astype(np.float32)
+        if noise:
+            panel = panel * (1 - noise) + rng.integers(0, 256, size=(rows, width, 3)) * noise
+        pixels[top:bottom] = panel.astype(np.uint8)
+
+    # Gutters: uniform white or black bands of 10-60 rows at the panel borders
+    for cut in cuts:
+        band = int(rng.integers(10, 61))
+        pixels[max(0, cut - band // 2):cut + band // 2] = 255 if rng.random() < 0.7 else 0
+
+    return Image.fromarray(pixels, "RGB")
+
+
+def generate_chapter(folder, pages=40, width=800, min_height=1200, max_height=2400,
+                     gutters=2, noise=0.2, seed=0, name_pattern="0000-{:03d}.png", start_num=1):
+    """
+    Write a synthetic chapter of numbered PNG pages to a folder.
+
+    Args:
+        folder: Output folder
+        pages: Number of pages
+        width: Page width in pixels
+        min_height: Smallest page height in pixels
+        max_height: Largest page height in pixels
+        gutters: Gutters per page
+        noise: Amount of noise in the panels, 0-1 (see generate_page)
+        seed: Random seed, so the same arguments always give the same chapter
+        name_pattern: File name pattern with one number field
+        start_num: Number of the first page
+
+    Returns:
+        List of page paths, in page order
+    """
+    os.makedirs(folder, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    heights = random.Random(seed).choices(range(min_height, max_height + 1), k=pages)
+
+    paths = []
+    for number, height in enumerate(heights, start=start_num):
+        path = os.path.join(folder, name_pattern.format(number))
+        generate_page(width, height, gutters, noise, rng).save(path, compress_level=1)
+        paths.append(path)
+    return paths
@@ -0,0 +1,437 @@
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ProtocolError
+
+# Status codes that are worth retrying: rate limiting and transient server errors
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# Status codes with which a host says it gets too many requests
+THROTTLE_STATUS_CODES = (429, 503)
+
+
+class IncompleteDownloadError(requests.RequestException):
+    """Raised when a downloaded file is shorter than announced or fails validation."""
+
+
+class _HostState:
+    def __init__(self, limit, max_bytes_per_second):
+        self.limit = float(limit)
+        self.in_flight = 0
+        self.slow_start = True
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self.latency = None  # smoothed seconds until the response headers arrive
+        self.min_latency = None
+        self.tokens = float(max_bytes_per_second or 0)
+        self.refilled = time.monotonic()
+        self.requests = 0
+        self.throttled = 0
+        self.bytes = 0
+        self.first_request = None
+        self.last_response = None
+
+
+class HostRateController:
+    def __init__(self, max_concurrency=10, min_concurrency=1, initial_concurrency=2,
+                 latency_tolerance=2.0, max_bytes_per_second=None, adaptive=True):
+        """
+        Per-host limit on requests in flight, adapted to what the host can take.
+
+        The limit of each host follows AIMD, like TCP congestion control: it
+        grows by one with every successful response until the first throttling
+        signal (slow start, doubling it per round trip), and afterwards by one
+        per round trip. A 429 or 503 response, a timeout or a connection error
+        halves it, at most once per round trip, and a Retry-After header pauses
+        every request to the host until it has passed. While the smoothed
+        latency is more than `latency_tolerance` times the fastest seen, the
+        limit stops growing, so a host that starts queueing stops the ramp
+        before it turns to errors. A request counts as in flight until its
+        response headers arrive.
+
+        Args:
+            max_concurrency: Highest limit per host (default: 10)
+            min_concurrency: Lowest limit per host (default: 1)
+            initial_concurrency: Limit of a host before any response (default: 2)
+            latency_tolerance: Latency, relative to the fastest response, above
+                which the limit no longer grows (default: 2.0)
+            max_bytes_per_second: Cap on the body bytes read per second from
+                each host (default: None, no cap)
+            adaptive: Whether the limit adapts; if False every host is allowed
+                `max_concurrency` requests, and only Retry-After and the byte
+                cap apply (default: True)
+        """
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.min_concurrency = max(1, min(int(min_concurrency), self.max_concurrency))
+        self.initial_concurrency = initial_concurrency if adaptive else self.max_concurrency
+        self.latency_tolerance = latency_tolerance
+        self.max_bytes_per_second = max_bytes_per_second
+        self.adaptive = adaptive
+        self._hosts = {}
+        self._condition = threading.Condition()
+
+    def _state(self, host):
+        state = self._hosts.get(host)
+        if state is None:
+            limit = min(self.max_concurrency, max(self.min_concurrency, self.initial_concurrency))
+            state = self._hosts[host] = _HostState(limit, self.max_bytes_per_second)
+        return state
+
+    def acquire(self, host):
+        """
+        Wait until a request to `host` may be sent, and count it as in flight.
+        """
+        with self._condition:
+            state = self._state(host)
+            while True:
+                pause = state.paused_until - time.monotonic()
+                if pause <= 0 and state.in_flight < int(state.limit):
+                    break
+                self._condition.wait(pause if pause > 0 else None)
+            state.in_flight += 1
+            state.requests += 1
+            if state.first_request is None:
+                state.first_request = time.monotonic()
+
+    def release(self, host, latency=None, throttled=False, retry_after=None):
+        """
+        Record the outcome of a request to `host` and adjust its limit.
+
+        Args:
+            host: Host the request was sent to
+            latency: Seconds until the response headers arrived, if it succeeded
+            throttled: Whether the host refused or dropped the request
+                (429/503, timeout, connection error)
+            retry_after: Seconds the host asked to wait (Retry-After header)
+        """
+        with self._condition:
+            state = self._state(host)
+            state.in_flight -= 1
+            now = time.monotonic()
+            state.last_response = now
+            if retry_after:
+                state.paused_until = max(state.paused_until, now + retry_after)
+
+            if throttled:
+                state.throttled += 1
+                # Responses to requests sent before the last decrease do not count again
+                if self.adaptive and now - state.last_decrease >= (state.latency or 0):
+                    state.limit = max(self.min_concurrency, state.limit / 2)
+                    state.last_decrease = now
+                    state.slow_start = False
+            elif latency is not None:
+                state.min_latency = latency if state.min_latency is None else min(state.min_latency, latency)
+                state.latency = latency if state.latency is None else 0.8 * state.latency + 0.2 * latency
+                limit_used = state.in_flight + 1 >= int(state.limit)
+                if self.adaptive and limit_used and state.latency <= self.latency_tolerance * state.min_latency:
+                    step = 1.0 if state.slow_start else 1.0 / state.limit
+                    state.limit = min(float(self.max_concurrency), state.limit + step)
+
+            self._condition.notify_all()
+
+    def consume(self, host, size):
+        """
+        Count `size` body bytes read from `host`, sleeping as long as needed to
+        stay under `max_bytes_per_second`.
+        """
+        with self._condition:
+            state = self._state(host)
+            state.bytes += size
+            if not self.max_bytes_per_second:
+                return
+            now = time.monotonic()
+            state.tokens = min(float(self.max_bytes_per_second),
+                               state.tokens + (now - state.refilled) * self.max_bytes_per_second)
+            state.refilled = now
+            state.tokens -= size
+            delay = -state.tokens / self.max_bytes_per_second if state.tokens < 0 else 0
+        if delay:
+            time.sleep(delay)
+
+    def report(self):
+        """
+        Limit each host settled on and the rates achieved so far.
+
+        Returns:
+            Dictionary of host to a dictionary with 'concurrency' (current
+            limit), 'requests', 'throttled', 'latency_s' (smoothed),
+            'requests_per_second' and 'bytes_per_second'
+        """
+        with self._condition:
+            report = {}
+            for host, state in self._hosts.items():
+                elapsed = (state.last_response or 0) - (state.first_request or 0)
+                report[host] = {
+                    'concurrency': int(state.limit),
+                    'requests': state.requests,
+                    'throttled': state.throttled,
+                    'latency_s': None if state.latency is None else round(state.latency, 3),
+                    'requests_per_second': round(state.requests / elapsed, 2) if elapsed > 0 else None,
+                    'bytes_per_second': round(state.bytes / elapsed) if elapsed > 0 else None,
+                }
+            return report
+
+
+class HttpClient:
+    def __init__(self, connect_timeout=5, read_timeout=30, max_retries=3,
+                 backoff_factor=0.5, max_backoff=30, pool_size=10, headers=None,
+                 adaptive_concurrency=False, max_bytes_per_second=None, latency_tolerance=2.0):
+        """
+        Shared HTTP client used by every download path.
+
+        Wraps one requests.Session so keep-alive connections are pooled per host
+        and reused across images, and adds timeouts and retries with jittered
+        exponential backoff that respects the server's Retry-After header.
+
+        Args:
+            connect_timeout: Seconds to wait for a connection (default: 5)
+            read_timeout: Seconds to wait between bytes of the response (default: 30)
+            max_retries: Retries for connection errors, timeouts and 429/5xx responses (default: 3)
+            backoff_factor: Base delay in seconds, doubled on every retry (default: 0.5)
+            max_backoff: Upper bound for a single delay in seconds (default: 30)
+            pool_size: Keep-alive connections kept per host, should be at least
+                the number of concurrent downloads (default: 10)
+            headers: Optional extra headers sent with every request
+            adaptive_concurrency: Whether requests per host are limited by a
+                HostRateController that finds the highest concurrency the host
+                takes without throttling, up to pool_size (default: False)
+            max_bytes_per_second: Cap on the download speed per host (default: None)
+            latency_tolerance: See HostRateController (default: 2.0)
+        """
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max(0, int(max_retries))
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+
+        self.rate_controller = None
+        if adaptive_concurrency or max_bytes_per_second:
+            self.rate_controller = HostRateController(max_concurrency=pool_size,
+                                                      latency_tolerance=latency_tolerance,
+                                                      max_bytes_per_second=max_bytes_per_second,
+                                                      adaptive=adaptive_concurrency)
+
+        self.session = requests.Session()
+        if headers:
+            self.session.headers.update(headers)
+
+        # Retries are handled in request() so that backoff and Retry-After work the same everywhere
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _backoff_delay(self, attempt):
+        """
+        Jittered exponential backoff ("full jitter") for the given retry attempt.
+        """
+        return random.uniform(0, min(self.max_backoff, self.backoff_factor * (2 ** attempt)))
+
+    def _retry_after_delay(self, response):
+        """
+        Parse the Retry-After header (seconds or HTTP date) of a response.
+
+        Returns:
+            Delay in seconds capped at max_backoff, or None if the header is missing or invalid
+        """
+        retry_after = response.headers.get('Retry-After')
+        if not retry_after:
+            return None
+        try:
+            delay = float(retry_after)
+        except ValueError:
+            try:
+                retry_at = parsedate_to_datetime(retry_after)
+            except (TypeError, ValueError):
+                return None
+            if retry_at.tzinfo is None:
+                retry_at = retry_at.replace(tzinfo=timezone.utc)
+            delay = (retry_at - datetime.now(timezone.utc)).total_seconds()
+        return min(self.max_backoff, max(0.0, delay))
+
+    def request(self, method, url, **kwargs):
+        """
+        Send a request, retrying transient failures.
+
+        Connection errors, timeouts and 429/5xx responses are retried up to
+        max_retries times. The last response is returned as is, so callers
+        still decide what to do with error statuses (e.g. raise_for_status()).
+        With a rate controller, every attempt waits for a free slot of the host.
+
+        Raises:
+            requests.RequestException: If the last attempt failed without a response
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        host = urlsplit(url).netloc
+
+        for attempt in range(self.max_retries + 1):
+            if self.rate_controller is not None:
+                self.rate_controller.acquire(host)
+            started = time.monotonic()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self._release(host, throttled=True)
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff_delay(attempt)
+            except BaseException:
+                self._release(host)
+                raise
+            else:
+                retry_after = self._retry_after_delay(response)
+                if response.status_code in THROTTLE_STATUS_CODES:
+                    self._release(host, throttled=True, retry_after=retry_after)
+                else:
+                    self._release(host, latency=time.monotonic() - started)
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                    return response
+                delay = retry_after
+                if delay is None:
+                    delay = self._backoff_delay(attempt)
+                response.close()
+
+            time.sleep(delay)
+
+    def _release(self, host, **outcome):
+        if self.rate_controller is not None:
+            self.rate_controller.release(host, **outcome)
+
+    def get(self, url, **kwargs):
+        """Send a GET request, see request()."""
+        return self.request('GET', url, **kwargs)
+
+    def head(self, url, **kwargs):
+        """Send a HEAD request, see request()."""
+        return self.request('HEAD', url, **kwargs)
+
+    def download_file(self, url, path, validate=None, chunk_size=64 * 1024, headers=None):
+        """
+        Stream a response body to disk without holding it in memory.
+
+        Data is written in chunks to `path + '.part'` and renamed to `path` only
+        once it is complete, so `path` never holds a partial file. The size is
+        checked against Content-Length, and `validate` can check the content
+        before the rename. If the transfer breaks off, the partial file is
+        resumed with an HTTP Range request on the next attempt (or the next call).
+        The ETag or Last-Modified date of the partial file is kept next to it
+        in `path + '.part.validator'` and sent as If-Range, so if the file
+        changed on the server it is sent whole instead of being stitched onto
+        the old bytes. A partial file without a validator is started over.
+
+        Conditional `headers` such as If-None-Match are only sent while nothing
+        has been downloaded yet, so a resumed transfer is never answered with
+        304 Not Modified for a different version of the file.
+
+        Args:
+            url: URL to download
+            path: Destination file path
+            validate: Optional callable taking the temporary file path and
+                returning False if the content is not usable
+            chunk_size: Bytes read per chunk (default: 64 KiB)
+            headers: Optional extra headers for a fresh (not resumed) request
+
+        Returns:
+            Headers of the response the file was completed with, or None if the
+            server answered 304 Not Modified and nothing was written
+
+        Raises:
+            requests.RequestException: If the download fails or is incomplete
+        """
+        part_path = path + '.part'
+        validator_path = part_path + '.validator'
+        host = urlsplit(url).netloc
+
+        for attempt in range(self.max_retries + 1):
+            resume_from = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            validator = None
+            if resume_from and os.path.exists(validator_path):
+                with open(validator_path, 'r', encoding='utf-8') as file:
+                    validator = file.read().strip() or None
+            if validator is None:
+                resume_from = 0
+            request_headers = ({'Range': f'bytes={resume_from}-', 'If-Range': validator} if resume_from
+                               else dict(headers or {}))
+
+            # Connection errors and timeouts before the body arrives were already
+            # retried by request() and propagate from here
+            with self.get(url, headers=request_headers, stream=True) as response:
+                if response.status_code == 304 and not resume_from:
+                    return None
+                if response.status_code == 416 and resume_from:
+                    # The partial file does not match the resource any more, start over
+                    self._discard_partial(part_path)
+                    continue
+                response.raise_for_status()
+
+                if response.status_code != 206:
+                    # Server ignored the Range header or the file changed, and sent everything
+                    resume_from = 0
+                    self._store_validator(validator_path, response.headers)
+                expected_size = response.headers.get('Content-Length')
+                if expected_size is not None and not response.headers.get('Content-Encoding'):
+                    expected_size = resume_from + int(expected_size)
+                else:
+                    expected_size = None  # Decoded size is unknown for compressed transfers
+
+                try:
+                    with open(part_path, 'ab' if resume_from else 'wb') as file:
+                        for chunk in response.iter_content(chunk_size=chunk_size):
+                            file.write(chunk)
+                            if self.rate_controller is not None:
+                                self.rate_controller.consume(host, len(chunk))
+                except (requests.ConnectionError, requests.exceptions.ChunkedEncodingError, ProtocolError):
+                    # The connection broke off in the middle of the body; the partial file is resumed
+                    if attempt >= self.max_retries:
+                        raise
+                    time.sleep(self._backoff_delay(attempt))
+                    continue
+                response_headers = response.headers
+
+            size = os.path.getsize(part_path)
+            if expected_size is not None and size != expected_size:
+                if size > expected_size or attempt >= self.max_retries:
+                    self._discard_partial(part_path)
+                    raise IncompleteDownloadError(f'{url}: got {size} of {expected_size} bytes')
+                continue  # Short read, resume the rest
+
+            if validate is not None and not validate(part_path):
+                self._discard_partial(part_path)
+                raise IncompleteDownloadError(f'{url}: downloaded file failed validation')
+
+            os.replace(part_path, path)
+            self._discard_partial(part_path)
+            return response_headers
+
+        raise IncompleteDownloadError(f'{url}: download did not complete after {self.max_retries + 1} attempts')
+
+    @staticmethod
+    def _discard_partial(part_path):
+        """Delete a partial download and its validator, where they exist."""
+        for leftover in (part_path, part_path + '.validator'):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+
+    @staticmethod
+    def _store_validator(validator_path, response_headers):
+        """
+        Keep the validator a partial download can be resumed with: a strong
+        ETag, or else the Last-Modified date. Weak ETags cannot be used in
+        If-Range, so without a usable validator the file is not resumed.
+        """
+        etag = response_headers.get('ETag')
+        validator = etag if etag and not etag.startswith('W/') else response_headers.get('Last-Modified')
+        if validator:
+            with open(validator_path, 'w', encoding='utf-8') as file:
+                file.write(validator)
+        elif os.path.exists(validator_path):
+            os.remove(validator_path)
+
+    def close(self):
+        """Close all pooled connections."""
+        self.session.close()
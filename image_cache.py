@@ -0,0 +1,156 @@
+import os
+import shutil
+import sqlite3
+import time
+from contextlib import contextmanager
+
+from manifest import file_sha256
+
+
+def default_cache_folder():
+    """
+    Per-user cache folder shared by every processor on the host.
+
+    %LOCALAPPDATA% on Windows, $XDG_CACHE_HOME or ~/.cache elsewhere.
+    """
+    root = os.environ.get('LOCALAPPDATA') or os.environ.get('XDG_CACHE_HOME') \
+        or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(root, 'webtoon_processor', 'images')
+
+
+class ImageCache:
+    def __init__(self, folder=None, max_bytes=2 * 1024 ** 3):
+        """
+        Content-addressed cache of downloaded images, shared across chapters,
+        series and processes.
+
+        Every image is stored once as a blob named by its SHA-256, and an
+        SQLite index maps each URL to its blob and the ETag / Last-Modified
+        validators the server sent. A cached URL is fetched with a conditional
+        request, and a 304 Not Modified answer is served from the blob without
+        any image bytes crossing the network. When the blobs grow past
+        `max_bytes`, the least recently used ones are evicted.
+
+        Args:
+            folder: Cache folder (default: default_cache_folder())
+            max_bytes: Total size of the blobs before eviction starts (default: 2 GiB)
+        """
+        self.folder = folder or default_cache_folder()
+        self.max_bytes = max_bytes
+        self.blob_folder = os.path.join(self.folder, 'blobs')
+        self.index_path = os.path.join(self.folder, 'index.sqlite')
+        os.makedirs(self.blob_folder, exist_ok=True)
+
+        with self._connect() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS blobs ('
+                               'sha256 TEXT PRIMARY KEY, size INTEGER, last_used REAL)')
+            connection.execute('CREATE TABLE IF NOT EXISTS urls ('
+                               'url TEXT PRIMARY KEY, sha256 TEXT, etag TEXT, last_modified TEXT)')
+            connection.execute('CREATE INDEX IF NOT EXISTS blobs_last_used ON blobs (last_used)')
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per operation keeps the cache safe to use
+        # from download threads and worker processes at the same time
+        connection = sqlite3.connect(self.index_path, timeout=30)
+        try:
+            connection.execute('PRAGMA journal_mode=WAL')
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def blob_path(self, sha256):
+        """Path of the blob with the given hash."""
+        return os.path.join(self.blob_folder, sha256[:2], sha256)
+
+    def lookup(self, url):
+        """
+        Cached entry of a URL.
+
+        Returns:
+            Dictionary with 'sha256', 'etag' and 'last_modified', or None if the
+            URL is not cached or its blob is gone
+        """
+        with self._connect() as connection:
+            row = connection.execute('SELECT sha256, etag, last_modified FROM urls WHERE url = ?',
+                                     (url,)).fetchone()
+        if row is None or not os.path.exists(self.blob_path(row[0])):
+            return None
+        return {'sha256': row[0], 'etag': row[1], 'last_modified': row[2]}
+
+    def conditional_headers(self, entry):
+        """
+        Headers that let the server answer 304 Not Modified for a cached entry.
+        """
+        headers = {}
+        if entry and entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def restore(self, entry, path):
+        """
+        Put a cached image at `path` (a hard link where possible) and mark it as used.
+        """
+        blob_path = self.blob_path(entry['sha256'])
+        temp_path = path + '.cache'
+        try:
+            os.link(blob_path, temp_path)
+        except OSError:
+            shutil.copyfile(blob_path, temp_path)
+        os.replace(temp_path, path)
+
+        with self._connect() as connection:
+            connection.execute('UPDATE blobs SET last_used = ? WHERE sha256 = ?', (time.time(), entry['sha256']))
+
+    def store(self, url, path, headers=None):
+        """
+        Add a downloaded image to the cache and evict old blobs if needed.
+
+        Args:
+            url: URL the image was downloaded from
+            path: Path of the complete image
+            headers: Response headers, for the ETag and Last-Modified validators
+        """
+        headers = headers or {}
+        sha256 = file_sha256(path)
+        blob_path = self.blob_path(sha256)
+
+        if not os.path.exists(blob_path):
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            temp_path = f'{blob_path}.{os.getpid()}.tmp'
+            try:
+                os.link(path, temp_path)
+            except OSError:
+                shutil.copyfile(path, temp_path)
+            os.replace(temp_path, blob_path)
+
+        with self._connect() as connection:
+            connection.execute('INSERT OR REPLACE INTO blobs (sha256, size, last_used) VALUES (?, ?, ?)',
+                               (sha256, os.path.getsize(blob_path), time.time()))
+            connection.execute('INSERT OR REPLACE INTO urls (url, sha256, etag, last_modified) '
+                               'VALUES (?, ?, ?, ?)',
+                               (url, sha256, headers.get('ETag'), headers.get('Last-Modified')))
+        self.evict()
+
+    def evict(self):
+        """
+        Delete least recently used blobs until the cache fits in `max_bytes`.
+        """
+        with self._connect() as connection:
+            total = connection.execute('SELECT COALESCE(SUM(size), 0) FROM blobs').fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            for sha256, size in connection.execute(
+                    'SELECT sha256, size FROM blobs ORDER BY last_used').fetchall():
+                if total <= self.max_bytes:
+                    break
+                connection.execute('DELETE FROM blobs WHERE sha256 = ?', (sha256,))
+                connection.execute('DELETE FROM urls WHERE sha256 = ?', (sha256,))
+                try:
+                    os.remove(self.blob_path(sha256))
+                except FileNotFoundError:
+                    pass
+                total -= size
@@ -1,5 +1,6 @@
 import os
 import requests
+from http_client import HttpClient
 
 def download_images(base_url, start_num, end_num, output_folder):
     # Ensure the output folder exists
@@ -10,10 +11,13 @@ def download_images(base_url, start_num, end_num, output_folder):
     end = int(end_num)
     urls = [base_url.replace('XXX', f'{i:03d}') for i in range(start, end + 1)]
     
+    # Reuse one pooled connection for all images, with timeouts and retries
+    http = HttpClient()
+    
     for url in urls:
         try:
             # Fetch the image
-            response = requests.get(url)
+            response = http.get(url)
             response.raise_for_status()  # Ensure we got a valid response
             
             # Get the image name and create the file path
@@ -115,10 +119,13 @@ def download_images(base_url, start_num, end_num, output_folder):
     end = int(end_num)
     urls = [base_url.replace('XXX', f'{i:03d}') for i in range(start, end + 1)]
     
+    # Reuse one pooled connection for all images, with timeouts and retries
+    http = HttpClient()
+    
     for url in urls:
         try:
             # Fetch the image
-            response = requests.get(url)
+            response = http.get(url)
             response.raise_for_status()  # Ensure we got a valid response
             
             # Get the image name and create the file path
@@ -0,0 +1,199 @@
+import hashlib
+import json
+import os
+import time
+
+# Stages of a chapter in processing order; --from-stage takes one of these names
+STAGES = ('download', 'merge_pdf', 'long_png', 'format', 'final_pdf')
+
+# Prefix of recorded paths that are relative to the scratch folder
+SCRATCH_PREFIX = '$scratch/'
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """
+    SHA-256 hex digest of a file, read in chunks.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ChapterManifest:
+    def __init__(self, path, base_folder, scratch_folder=None):
+        """
+        Record of the completed stages of one chapter, stored as JSON.
+
+        Every stage is recorded with its parameters, the SHA-256 of its input
+        files (the outputs of the stage before it) and the size, modification
+        time and SHA-256 of its output files. A stage whose parameters and
+        inputs are unchanged and whose outputs are still on disk does not have
+        to run again. Files whose size and modification time match the record
+        are trusted without hashing them again.
+
+        Files in the scratch folder are stored relative to it (with
+        SCRATCH_PREFIX), and the scratch folder itself is recorded separately.
+        They are looked up in the current scratch folder, so after a reboot
+        or with another scratch folder they are simply missing, and the
+        stages that need them run again.
+
+        Args:
+            path: Path of the manifest JSON file
+            base_folder: Folder file paths are stored relative to
+            scratch_folder: Folder of the temporary files, if it is not
+                base_folder (default: None)
+        """
+        self.path = path
+        self.base_folder = base_folder
+        self.scratch_folder = scratch_folder
+        self.stages = {}
+        self.reusable = set()  # Stages process_chapter takes as they are, see reusable_stages()
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as file:
+                    self.stages = json.load(file).get('stages', {})
+            except (OSError, ValueError):
+                self.stages = {}  # Unreadable manifest, every stage runs again
+
+    def _relative(self, path):
+        for folder, prefix in [(self.base_folder, ''), (self.scratch_folder, SCRATCH_PREFIX)]:
+            if folder is None:
+                continue
+            try:
+                relative_path = os.path.relpath(path, folder)
+            except ValueError:  # Different drives on Windows
+                continue
+            if relative_path != os.pardir and not relative_path.startswith(os.pardir + os.sep):
+                return prefix + relative_path.replace(os.sep, '/')
+        # Anywhere else, e.g. a file passed in from outside both folders
+        return os.path.abspath(path)
+
+    def _absolute(self, relative_path):
+        if relative_path.startswith(SCRATCH_PREFIX):
+            folder = self.scratch_folder or self.base_folder
+            return os.path.join(folder, *relative_path[len(SCRATCH_PREFIX):].split('/'))
+        if os.path.isabs(relative_path):
+            return relative_path
+        return os.path.join(self.base_folder, *relative_path.split('/'))
+
+    def _file_record(self, path):
+        stat = os.stat(path)
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': file_sha256(path)}
+
+    def _verify_file(self, relative_path, record):
+        path = self._absolute(relative_path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        if stat.st_size != record['size']:
+            return False
+        if stat.st_mtime_ns == record['mtime_ns']:
+            return True
+        return file_sha256(path) == record['sha256']
+
+    def fingerprint(self, stage):
+        """
+        SHA-256 of every output file of a recorded stage, keyed by relative path.
+
+        Returns:
+            Dictionary of path to hash, empty if the stage is not recorded
+        """
+        outputs = self.stages.get(stage, {}).get('outputs', {})
+        return {path: record['sha256'] for path, record in outputs.items()}
+
+    def is_current(self, stage, params, inputs, verify_outputs=True):
+        """
+        Check whether a stage can be skipped.
+
+        Args:
+            stage: Stage name, one of STAGES
+            params: Settings that change the outputs of the stage
+            inputs: Fingerprint of the stage's inputs (see fingerprint())
+            verify_outputs: Whether the outputs have to be on disk and unchanged
+
+        Returns:
+            True if the stage was completed with the same parameters and inputs
+        """
+        entry = self.stages.get(stage)
+        if entry is None or entry['params'] != params or entry['inputs'] != inputs:
+            return False
+        if not verify_outputs:
+            return True
+        return all(self._verify_file(path, record) for path, record in entry['outputs'].items())
+
+    def reusable_stages(self, chain):
+        """
+        Stages at the start of a chain that do not have to run again.
+
+        A stage is taken as it is if it and every stage before it are recorded
+        with these parameters and consumed exactly the recorded outputs of the
+        stage before it, up to the last such stage whose outputs are still on
+        disk. Outputs of the stages before that one need not exist, so a
+        chapter whose raw images were cleaned up is re-sliced from the kept
+        long PNG without downloading anything.
+
+        Args:
+            chain: List of (stage, params) tuples in processing order
+
+        Returns:
+            Names of the reusable stages, in chain order
+        """
+        recorded = []
+        inputs = {}
+        for stage, params in chain:
+            if not self.is_current(stage, params, inputs, verify_outputs=False):
+                break
+            recorded.append(stage)
+            inputs = self.fingerprint(stage)
+
+        for index in range(len(recorded) - 1, -1, -1):
+            outputs = self.stages[recorded[index]]['outputs']
+            if all(self._verify_file(path, record) for path, record in outputs.items()):
+                return recorded[:index + 1]
+        return []
+
+    def result(self, stage):
+        """Path (or list of paths) returned by the stage when it was recorded."""
+        result = self.stages[stage]['result']
+        if isinstance(result, list):
+            return [self._absolute(path) if path is not None else None for path in result]
+        return self._absolute(result)
+
+    def record(self, stage, params, inputs, result, output_paths):
+        """
+        Record a completed stage and save the manifest.
+
+        Args:
+            stage: Stage name, one of STAGES
+            params: Settings that change the outputs of the stage
+            inputs: Fingerprint of the stage's inputs
+            result: Path the stage returned (a file or folder), or a list of
+                paths, one per output profile
+            output_paths: Files the stage produced
+        """
+        self.stages[stage] = {
+            'params': params,
+            'inputs': inputs,
+            'result': ([self._relative(path) if path is not None else None for path in result]
+                       if isinstance(result, list) else self._relative(result)),
+            'outputs': {self._relative(path): self._file_record(path) for path in output_paths},
+            'completed_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+        self.save()
+
+    def invalidate_from(self, stage):
+        """Forget the given stage and every stage after it."""
+        for name in STAGES[STAGES.index(stage):]:
+            self.stages.pop(name, None)
+        self.save()
+
+    def save(self):
+        """Write the manifest atomically, so a crash never leaves a partial file."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump({'scratch_folder': self.scratch_folder, 'stages': self.stages}, file, indent=1)
+        os.replace(temp_path, self.path)
@@ -0,0 +1,250 @@
+import cProfile
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Counters every chapter reports, even when they stay at zero
+COUNTERS = ('bytes_downloaded', 'images_from_cache', 'images_decoded', 'slices_emitted', 'bytes_written')
+
+# Attributes every LogRecord has; anything else was passed with extra= and goes into JSON logs
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+def _proc_status_bytes(field):
+    """
+    Memory field of /proc/self/status in bytes, or None without /proc (not Linux).
+    """
+    try:
+        with open('/proc/self/status', 'r', encoding='ascii') as file:
+            for line in file:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def current_rss_bytes():
+    """
+    Resident set size of the current process, or None if it cannot be measured.
+    """
+    rss = _proc_status_bytes('VmRSS')
+    if rss is not None:
+        return rss
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+def reset_peak_rss():
+    """
+    Reset the peak resident set size of the current process to its current
+    size, so peak_rss_bytes() measures from now on (Linux only).
+
+    Returns:
+        True if the peak was reset
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w', encoding='ascii') as file:
+            file.write('5')
+    except OSError:
+        return False
+    return True
+
+
+def peak_rss_bytes():
+    """
+    Peak resident set size of the current process, or None if it cannot be measured.
+
+    On Linux this is VmHWM, which belongs to this process alone. getrusage's
+    ru_maxrss is only used elsewhere: on Linux it carries over from the parent
+    across fork and exec, so a small child would report its parent's peak.
+    """
+    peak = _proc_status_bytes('VmHWM')
+    if peak is not None:
+        return peak
+    try:
+        import resource
+    except ImportError:  # Windows
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return psutil.Process().memory_info().peak_wset
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024  # bytes on macOS, KiB on Linux
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format log records as one JSON object per line, including extra= fields.
+    """
+    def format(self, record):
+        entry = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created)),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES})
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level='INFO', log_format='text', stream=None):
+    """
+    Send log records to the console as plain messages or JSON lines.
+
+    Args:
+        level: Lowest level shown; DEBUG adds a line per image and per slice (default: INFO)
+        log_format: 'text' or 'json' (default: 'text')
+        stream: Stream to write to (default: stdout)
+    """
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(JsonFormatter() if log_format == 'json' else logging.Formatter('%(message)s'))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+
+
+class ChapterMetrics:
+    def __init__(self, chapter=None, series=None, profile_folder=None):
+        """
+        Stage timings and counters of one chapter.
+
+        Every stage records wall time, CPU time of the process and the peak
+        RSS so far, plus how much each counter grew while it ran. Counters can
+        be added to from any thread.
+
+        Args:
+            chapter: Chapter number, used as a label
+            series: Series name, used as a label
+            profile_folder: If given, every stage is run under cProfile and the
+                statistics are saved there as ChapterN_<stage>.prof (the profiler
+                only sees the thread that runs the stage)
+        """
+        self.chapter = chapter
+        self.series = series
+        self.profile_folder = profile_folder
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.stages = []
+        self.status = None  # 'ok', 'skipped', 'empty' or 'failed' once the chapter is done
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def add(self, counter, amount=1):
+        """Increase a counter."""
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Time the code in the with block as stage `name`.
+        """
+        labels = {'chapter': self.chapter, 'stage': name}
+        logger.debug(f"Stage {name} started", extra={'event': 'stage_start', **labels})
+        with self._lock:
+            counters_before = dict(self.counters)
+
+        profiler = None
+        if self.profile_folder:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        wall_started, cpu_started = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall_started, time.process_time() - cpu_started
+            if profiler is not None:
+                profiler.disable()
+                os.makedirs(self.profile_folder, exist_ok=True)
+                profiler.dump_stats(os.path.join(self.profile_folder, f"Chapter{self.chapter}_{name}.prof"))
+
+            with self._lock:
+                counters = {key: value - counters_before.get(key, 0) for key, value in self.counters.items()}
+            record = {'stage': name, 'wall_s': round(wall, 3), 'cpu_s': round(cpu, 3),
+                      'peak_rss_bytes': peak_rss_bytes(), **counters}
+            self.stages.append(record)
+            logger.info(f"Stage {name} took {wall:.2f}s (CPU {cpu:.2f}s)",
+                        extra={'event': 'stage_end', 'chapter': self.chapter, **record})
+
+    def to_dict(self):
+        """All metrics of the chapter as a JSON-ready dictionary."""
+        return {
+            'chapter': self.chapter,
+            'series': self.series,
+            'status': self.status,
+            'started': self.started,
+            'wall_s': round(time.time() - self.started, 3),
+            'peak_rss_bytes': peak_rss_bytes(),
+            'counters': dict(self.counters),
+            'stages': list(self.stages),
+        }
+
+    def to_prometheus(self):
+        """
+        All metrics of the chapter in the Prometheus text exposition format,
+        for node_exporter's textfile collector.
+        """
+        data = self.to_dict()
+        labels = f'series="{_escape(self.series)}",chapter="{_escape(self.chapter)}"'
+        lines = []
+
+        def metric(name, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for extra_labels, value in samples:
+                if value is not None:
+                    lines.append(f"{name}{{{labels}{extra_labels}}} {value}")
+
+        metric('webtoon_chapter_success', "1 if the last run of the chapter succeeded",
+               [('', int(self.status in ('ok', 'skipped')))])
+        metric('webtoon_chapter_last_run_timestamp_seconds', "Start of the last run of the chapter",
+               [('', round(self.started, 3))])
+        metric('webtoon_chapter_duration_seconds', "Wall time of the last run of the chapter",
+               [('', data['wall_s'])])
+        metric('webtoon_chapter_peak_rss_bytes', "Peak resident memory of the process",
+               [('', data['peak_rss_bytes'])])
+        for counter in COUNTERS:
+            metric(f'webtoon_chapter_{counter}', f"{counter.replace('_', ' ').capitalize()} in the last run",
+                   [('', data['counters'].get(counter, 0))])
+        for key, name, help_text in [('wall_s', 'webtoon_stage_duration_seconds', "Wall time of a stage"),
+                                     ('cpu_s', 'webtoon_stage_cpu_seconds', "CPU time of the process during a stage")]:
+            metric(name, help_text, [(f',stage="{stage["stage"]}"', stage[key]) for stage in data['stages']])
+        return '\n'.join(lines) + '\n'
+
+    def write(self, folder, metrics_format='json'):
+        """
+        Save the metrics atomically as ChapterN.metrics.json or ChapterN.prom.
+
+        Returns:
+            Path of the written file
+        """
+        os.makedirs(folder, exist_ok=True)
+        if metrics_format == 'prometheus':
+            path = os.path.join(folder, f"Chapter{self.chapter}.prom")
+            content = self.to_prometheus()
+        else:
+            path = os.path.join(folder, f"Chapter{self.chapter}.metrics.json")
+            content = json.dumps(self.to_dict(), indent=1)
+
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        os.replace(temp_path, path)
+        return path
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -2,8 +2,22 @@
 """
 Run Webtoon Processor with YAML configuration
 """
+import argparse
+import json
+import logging
+import os
+import re
+import time
 import yaml
-from webtoon_processor import WebtoonProcessor
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from http_client import HttpClient
+from image_cache import ImageCache
+from manifest import STAGES
+from metrics import configure_logging
+from watcher import ChapterWatcher, WatchState
+from webtoon_processor import WebtoonProcessor, default_scratch_folder, profile_chapter
+
+logger = logging.getLogger(__name__)
 
 def load_config(config_file="config.yaml"):
     """Load configuration from YAML file"""
@@ -12,64 +26,375 @@ def load_config(config_file="config.yaml"):
             config = yaml.safe_load(file)
         return config
     except FileNotFoundError:
-        print(f"❌ Configuration file '{config_file}' not found!")
-        print("Please create a config.yaml file with your settings.")
+        logger.error(f"❌ Configuration file '{config_file}' not found!")
+        logger.info("Please create a config.yaml file with your settings.")
         return None
     except yaml.YAMLError as e:
-        print(f"❌ Error reading YAML configuration: {e}")
+        logger.error(f"❌ Error reading YAML configuration: {e}")
+        return None
+
+def scratch_folder(config):
+    """Folder for intermediates: scratch_folder, a tmpfs/temp folder with ephemeral, or the output folder"""
+    if config.get('scratch_folder'):
+        return config['scratch_folder']
+    if config.get('ephemeral', False):
+        return default_scratch_folder(config['output_folder'])
+    return None
+
+def create_image_cache(config):
+    """Open the image cache shared by all processors on this host, if enabled"""
+    if not config.get('image_cache', False):
         return None
+    return ImageCache(config.get('image_cache_folder'),
+                      max_bytes=int(config.get('image_cache_max_mb', 2048)) * 1024 ** 2)
+
+def create_processor(config):
+    """Create a WebtoonProcessor with a shared HTTP client from the configuration"""
+    max_concurrency = int(config.get('max_concurrency', 1))
+    http_client = HttpClient(pool_size=max(max_concurrency, 10), **(config.get('http') or {}))
+    return WebtoonProcessor(config['output_folder'], max_concurrency=max_concurrency,
+                            discover_range=config.get('discover_range', False),
+                            http_client=http_client,
+                            use_memmap=config.get('use_memmap', False),
+                            pdf_passthrough=config.get('pdf_passthrough', False),
+                            resume=config.get('resume', False),
+                            encode_workers=config.get('encode_workers'),
+                            png_compress_level=config.get('png_compress_level', 6),
+                            png_optimize=config.get('png_optimize', False),
+                            fast_intermediates=config.get('fast_intermediates', False),
+                            scratch_folder=scratch_folder(config),
+                            slice_format=config.get('slice_format', 'png'),
+                            slice_quality=config.get('slice_quality'),
+                            pdf_image_format=config.get('pdf_image_format', 'jpeg'),
+                            pdf_image_quality=config.get('pdf_image_quality'),
+                            image_cache=create_image_cache(config),
+                            metrics_folder=config.get('metrics_folder'),
+                            metrics_format=config.get('metrics_format', 'json'),
+                            profile_folder=config.get('profile_folder'),
+                            strip_width=config.get('strip_width'),
+                            preview_width=config.get('preview_width'),
+                            pdf_fast_web_view=config.get('pdf_fast_web_view', False))
+
+def chapter_options(config):
+    """Keyword arguments for process_chapter taken from the configuration"""
+    return {
+        'start_num': config.get('start_num', '001'),
+        'cleanup': not config.get('keep_temp_files', False),
+        'direct_strip': config.get('direct_strip', False),
+        'virtual_strip': config.get('virtual_strip', False),
+        'save_long_png': config.get('save_long_png', True),
+        'pipelined': config.get('pipelined', False),
+        'from_stage': config.get('from_stage'),
+        'page_height': config.get('page_height'),
+        'min_height': config.get('min_slice_height'),
+        'profiles': config.get('profiles'),
+    }
+
+def parse_chapters(spec):
+    """
+    Expand a chapter list into chapter numbers (as strings).
+    
+    Accepts a list of numbers and "first-last" ranges, e.g. [0, 2, "5-8"],
+    or the same as a comma separated string, e.g. "0, 2, 5-8".
+    """
+    if isinstance(spec, (int, str)):
+        spec = str(spec).split(',')
+    
+    chapters = []
+    for item in spec:
+        item = str(item).strip()
+        match = re.fullmatch(r'(\d+)\s*-\s*(\d+)', item)
+        if match:
+            first, last = int(match.group(1)), int(match.group(2))
+            chapters.extend(str(number) for number in range(first, last + 1))
+        elif item:
+            chapters.append(item)
+    return chapters
+
+def chapter_url(base_url, chapter_number):
+    """Fill the {chapter} placeholder of a URL template, e.g. {chapter:04d}"""
+    if '{chapter' not in base_url:
+        return base_url
+    chapter = int(chapter_number) if str(chapter_number).isdigit() else chapter_number
+    return base_url.format(chapter=chapter)
+
+def chapter_summary(processor, chapter_number, profiles=None):
+    """
+    Size summary of a processed chapter, or None if none was written.
+    
+    With profiles, the summary of every profile (ChapterN_<name>_Final.summary.json)
+    is kept under 'profiles' by name, and 'slices' and 'final_pdf' hold the
+    totals of all profiles.
+    """
+    names = [(profile['name'], profile_chapter(chapter_number, profile)) for profile in profiles or []]
+    summaries = {}
+    for name, summary_chapter in names or [(None, chapter_number)]:
+        path = processor.summary_path(summary_chapter)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as file:
+                summaries[name] = json.load(file)
+    
+    if not profiles or not summaries:
+        return summaries.get(None)
+    return {
+        'chapter': chapter_number,
+        'profiles': summaries,
+        'slices': {'count': sum(summary['slices']['count'] for summary in summaries.values()),
+                   'bytes': sum(summary['slices']['bytes'] for summary in summaries.values())},
+        'final_pdf': {'bytes': sum(summary['final_pdf']['bytes'] for summary in summaries.values())},
+    }
+
+def process_single_chapter(config, chapter_number):
+    """
+    Process one chapter and report the outcome instead of raising, so one
+    failing chapter does not stop a batch. Runs inside a worker process.
+    """
+    configure_logging(config.get('log_level', 'INFO'), config.get('log_format', 'text'))
+    started = time.time()
+    result = {'chapter': chapter_number, 'ok': False, 'final_pdf': None, 'error': None}
+    try:
+        processor = create_processor(config)
+        final_pdf_path = processor.process_chapter(
+            base_url=chapter_url(config['base_url'], chapter_number),
+            chapter_number=chapter_number,
+            **chapter_options(config)
+        )
+        if isinstance(final_pdf_path, list):
+            # One final PDF per output profile
+            final_pdf_path = ', '.join(final_pdf_path) if all(final_pdf_path) else None
+        result['final_pdf'] = final_pdf_path
+        result['ok'] = final_pdf_path is not None
+        if not result['ok']:
+            result['error'] = "No images were found for this chapter"
+        else:
+            summary = chapter_summary(processor, chapter_number, config.get('profiles'))
+            if summary is not None:
+                result['summary'] = summary
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['seconds'] = time.time() - started
+    return result
+
+def chapter_result(future, chapter):
+    """
+    Result of process_single_chapter run on a worker process, or a failed
+    result if the worker process itself died (e.g. killed for running out of
+    memory) before returning one.
+    """
+    try:
+        return future.result()
+    except Exception as e:
+        return {'chapter': chapter, 'ok': False, 'final_pdf': None,
+                'error': f"{type(e).__name__}: {e}", 'seconds': 0.0}
+
+def run_batch(config, chapters):
+    """
+    Process several chapters in parallel on a pool of worker processes.
+    
+    Image decoding and slicing are CPU-bound, so chapters are spread across
+    processes (`workers` in config.yaml, default: number of CPUs). Each
+    chapter succeeds or fails on its own, and a summary is logged at the end.
+    
+    Returns:
+        List of per-chapter results, in chapter order
+    """
+    workers = max(1, min(int(config.get('workers') or os.cpu_count() or 1), len(chapters)))
+    logger.info(f"Processing {len(chapters)} chapters with {workers} worker processes")
+    
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(process_single_chapter, config, chapter): chapter for chapter in chapters}
+        for future in as_completed(futures):
+            chapter = futures[future]
+            result = chapter_result(future, chapter)
+            results[chapter] = result
+            status = "✅" if result['ok'] else "❌"
+            logger.info(f"{status} Chapter {chapter} finished in {result['seconds']:.1f}s")
+    
+    ordered = [results[chapter] for chapter in chapters]
+    failed = [result for result in ordered if not result['ok']]
+    
+    logger.info("=" * 50)
+    logger.info(f"Batch summary: {len(ordered) - len(failed)} succeeded, {len(failed)} failed")
+    for result in ordered:
+        if result['ok']:
+            size = ""
+            if result.get('summary'):
+                size = f", {result['summary']['final_pdf']['bytes'] / 1024 ** 2:.1f} MiB"
+            logger.info(f"  ✅ Chapter {result['chapter']}: {result['final_pdf']} ({result['seconds']:.1f}s{size})")
+        else:
+            logger.error(f"  ❌ Chapter {result['chapter']}: {result['error']}")
+    return ordered
+
+def watch_series(config):
+    """
+    Configuration of every watched series: the entries of watch.series on top
+    of the main settings, or the main settings as a single series.
+    """
+    base = {key: value for key, value in config.items() if key not in ('watch', 'chapters')}
+    entries = (config.get('watch') or {}).get('series') or [{}]
+    series = {}
+    for entry in entries:
+        series_config = {**base, **entry}
+        name = series_config.get('name') or os.path.basename(os.path.normpath(series_config.get('output_folder') or ''))
+        series_config['name'] = name
+        series[name] = series_config
+    return series
+
+def watch(config, once=False):
+    """
+    Poll the configured series for new chapters and process them as they are
+    released (see watcher.ChapterWatcher).
+    
+    Returns:
+        False if the configuration is invalid, True otherwise
+    """
+    settings = config.get('watch') or {}
+    series = watch_series(config)
+    for name, series_config in series.items():
+        if not series_config.get('output_folder') or '{chapter' not in (series_config.get('base_url') or ''):
+            logger.error(f"❌ Series '{name}' needs an output_folder and a base_url with a {{chapter}} placeholder")
+            return False
+    
+    # One processor per series for the HEAD probes, sharing its HTTP client between checks
+    processors = {name: create_processor(series_config) for name, series_config in series.items()}
+    
+    def probe(series_config, chapter_number):
+        processor = processors[series_config['name']]
+        return processor.chapter_available(chapter_url(series_config['base_url'], chapter_number),
+                                           str(series_config.get('start_num', '001')))
+    
+    state = WatchState(settings.get('state_file', 'watch_state.sqlite'))
+    watcher = ChapterWatcher(state, series, probe, process_single_chapter,
+                             interval=float(settings.get('interval_minutes', 60)) * 60,
+                             workers=settings.get('workers') or 1,
+                             max_attempts=int(settings.get('max_attempts', 3)),
+                             result_of=chapter_result)
+    
+    logger.info(f"Watching {', '.join(series)} every {settings.get('interval_minutes', 60)} minutes "
+                f"(state: {state.path})")
+    try:
+        watcher.run(once=once)
+    except KeyboardInterrupt:
+        logger.info("Stopped watching; the next run resumes from the saved state")
+    return True
+
+def parse_args():
+    """Parse the command line options"""
+    parser = argparse.ArgumentParser(description="Run Webtoon Processor with YAML configuration")
+    parser.add_argument('--from-stage', choices=STAGES,
+                        help="With resume enabled, run this stage and every later one again "
+                             "even if the manifest records them as complete")
+    parser.add_argument('--watch', action='store_true',
+                        help="Keep running, check the series for new chapters on a schedule "
+                             "and process them as they appear")
+    parser.add_argument('--once', action='store_true',
+                        help="Like --watch, but check every series once, process what was found and exit")
+    return parser.parse_args()
 
 def main():
-    print("=== Webtoon Processor ===")
-    print("Loading configuration from config.yaml...")
+    args = parse_args()
+    configure_logging()
+    
+    logger.info("=== Webtoon Processor ===")
+    logger.info("Loading configuration from config.yaml...")
     
     # Load configuration from YAML file
     config = load_config()
     if config is None:
         return False
+    configure_logging(config.get('log_level', 'INFO'), config.get('log_format', 'text'))
+    if args.from_stage:
+        config['from_stage'] = args.from_stage
+    
+    # Watch mode: poll for new chapters instead of processing the configured ones
+    if args.watch or args.once:
+        return watch(config, once=args.once)
     
     # Extract configuration values
     base_url = config.get('base_url')
     chapter_number = str(config.get('chapter_number', '0'))
     output_folder = config.get('output_folder')
-    start_num = config.get('start_num', '001')
-    keep_temp_files = config.get('keep_temp_files', False)
+    options = chapter_options(config)
     
     # Validate required fields
     if not base_url or not output_folder:
-        print("❌ Missing required configuration: base_url and output_folder must be specified")
+        logger.error("❌ Missing required configuration: base_url and output_folder must be specified")
         return False
     
-    print(f"Processing Chapter {chapter_number}")
-    print(f"Base URL: {base_url}")
-    print(f"Output folder: {output_folder}")
-    print(f"Start image: {start_num}")
-    print(f"Keep temporary files: {keep_temp_files}")
-    print("-" * 50)
+    # Batch mode: a list of chapters spread across worker processes
+    if config.get('chapters') is not None:
+        chapters = parse_chapters(config['chapters'])
+        if not chapters:
+            logger.error("❌ The chapters list is empty")
+            return False
+        logger.info(f"Chapters: {', '.join(chapters)}")
+        logger.info(f"Base URL template: {base_url}")
+        logger.info(f"Output folder: {output_folder}")
+        logger.info("-" * 50)
+        results = run_batch(config, chapters)
+        return all(result['ok'] for result in results)
+    
+    logger.info(f"Processing Chapter {chapter_number}")
+    logger.info(f"Base URL: {base_url}")
+    logger.info(f"Output folder: {output_folder}")
+    logger.info(f"Start image: {options['start_num']}")
+    logger.info(f"Keep temporary files: {not options['cleanup']}")
+    logger.info(f"Max concurrent downloads: {config.get('max_concurrency', 1)}")
+    logger.info(f"Adapt concurrency to the host: {(config.get('http') or {}).get('adaptive_concurrency', False)}")
+    logger.info(f"Probe for chapter length: {config.get('discover_range', False)}")
+    logger.info(f"Build long PNG directly from images: {options['direct_strip']}")
+    logger.info(f"Slice pages as a virtual strip: {options['virtual_strip']}")
+    logger.info(f"Overlap download, decode and slicing: {options['pipelined']}")
+    logger.info(f"Memory-mapped pixel buffer: {config.get('use_memmap', False)}")
+    logger.info(f"Long strip width: {config.get('strip_width') or 'native'}")
+    logger.info(f"Embed JPEG/PNG data in PDFs without re-encoding: {config.get('pdf_passthrough', False)}")
+    if options['profiles']:
+        logger.info(f"Output profiles: {', '.join(str(profile.get('name')) for profile in options['profiles'])}")
+    else:
+        logger.info(f"Page height: {options['page_height'] or 'A4'}")
+    logger.info(f"PNG compression level: {config.get('png_compress_level', 6)}"
+                f"{' (optimized)' if config.get('png_optimize', False) else ''}")
+    logger.info(f"Slice format: {config.get('slice_format', 'png')}"
+                f"{' q' + str(config['slice_quality']) if config.get('slice_quality') else ''}")
+    logger.info(f"PDF image encoding: {config.get('pdf_image_format', 'jpeg')}"
+                f"{' q' + str(config['pdf_image_quality']) if config.get('pdf_image_quality') else ''}")
+    logger.info(f"Final PDFs for fast web view: {config.get('pdf_fast_web_view', False)}")
+    logger.info(f"Fast compression for temporary slices: {config.get('fast_intermediates', False)}")
+    logger.info(f"Shared image cache: {config.get('image_cache', False)}")
+    logger.info(f"Metrics folder: {config.get('metrics_folder') or 'not written'}")
+    logger.info(f"Temporary files folder: {scratch_folder(config) or output_folder}")
+    logger.info(f"Skip completed stages: {config.get('resume', False)}")
+    if options['from_stage']:
+        logger.info(f"Run again from stage: {options['from_stage']}")
+    logger.info("-" * 50)
     
     try:
-        # Create processor instance
-        processor = WebtoonProcessor(output_folder)
+        # Create processor instance with a shared HTTP client
+        processor = create_processor(config)
         
         # Process the chapter
-        print(f"\nStarting to process Chapter {chapter_number}...")
+        logger.info(f"Starting to process Chapter {chapter_number}...")
         final_pdf_path = processor.process_chapter(
-            base_url=base_url,
+            base_url=chapter_url(base_url, chapter_number),
             chapter_number=chapter_number,
-            start_num=start_num,
-            cleanup=not keep_temp_files
+            **options
         )
         
-        print(f"\n✅ Success! Final PDF saved at: {final_pdf_path}")
-        print(f"📁 Check the FinalPDFs folder in: {output_folder}")
+        if isinstance(final_pdf_path, list):
+            # One final PDF per output profile; a missing one fails the chapter
+            final_pdf_path = ', '.join(final_pdf_path) if all(final_pdf_path) else None
+        if final_pdf_path is None:
+            logger.error(f"❌ No final PDF was created for Chapter {chapter_number}")
+            return False
+        logger.info(f"✅ Success! Final PDF saved at: {final_pdf_path}")
+        logger.info(f"📁 Check the FinalPDFs folder in: {output_folder}")
         
     except Exception as e:
-        print(f"\n❌ Error occurred: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"❌ Error occurred: {str(e)}")
         return False
     
     return True
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -0,0 +1,603 @@
+import os
+import struct
+import zlib
+from bisect import bisect_right
+
+import numpy as np
+from PIL import Image
+
+
+def uniform_row_masks(pixels):
+    """
+    Classify every row of an RGB pixel array as uniformly black or white.
+
+    Args:
+        pixels: Array of shape (height, width, 3) with dtype uint8
+
+    Returns:
+        Tuple of boolean arrays (black_rows, white_rows), one entry per row
+    """
+    rows = pixels.reshape(pixels.shape[0], -1)
+    return rows.max(axis=1) == 0, rows.min(axis=1) == 255
+
+
+def find_band_starts(black_rows, white_rows, band_height=5, pad_end=True):
+    """
+    Find the rows where a uniformly black or white band of `band_height` rows starts.
+
+    Matches WebtoonProcessor.is_black_or_white_band for every row: bands
+    reaching past the bottom of the image are padded with black rows, as
+    PIL's crop does.
+
+    Args:
+        black_rows: Boolean array, True for uniformly black rows
+        white_rows: Boolean array, True for uniformly white rows
+        band_height: Number of rows in a band (default: 5)
+        pad_end: Whether bands may reach past the last row; False when more
+            rows are still to come and only complete bands can be judged
+
+    Returns:
+        Sorted array of the row indices that start a band
+    """
+    padding = band_height - 1 if pad_end else 0
+    black = np.concatenate([black_rows, np.ones(padding, dtype=bool)])
+    white = np.concatenate([white_rows, np.zeros(padding, dtype=bool)])
+
+    def full_windows(mask):
+        # Sliding window sum over band_height rows via a cumulative sum
+        counts = np.concatenate([[0], np.cumsum(mask, dtype=np.int64)])
+        return counts[band_height:] - counts[:-band_height] == band_height
+
+    return np.flatnonzero(full_windows(black) | full_windows(white))
+
+
+def _png_chunk(chunk_type, data):
+    """Encode one PNG chunk (length, type, data, CRC)."""
+    return (struct.pack('>I', len(data)) + chunk_type + data +
+            struct.pack('>I', zlib.crc32(chunk_type + data) & 0xffffffff))
+
+
+def read_png_stream(path):
+    """
+    Read the header fields and the raw compressed image data of a PNG file.
+
+    Returns:
+        Dict with width, height, bit_depth, color_type, interlace, has_transparency
+        and data (the concatenated IDAT payloads, a zlib stream of filtered rows)
+    """
+    with open(path, 'rb') as file:
+        content = file.read()
+
+    if not content.startswith(b'\x89PNG\r\n\x1a\n'):
+        raise ValueError(f'{path} is not a PNG file')
+
+    info = {'has_transparency': False}
+    data = []
+    pos = 8
+    while pos + 8 <= len(content):
+        length, chunk_type = struct.unpack('>I4s', content[pos:pos + 8])
+        chunk = content[pos + 8:pos + 8 + length]
+        if chunk_type == b'IHDR':
+            (info['width'], info['height'], info['bit_depth'], info['color_type'],
+             _, _, info['interlace']) = struct.unpack('>IIBBBBB', chunk)
+        elif chunk_type == b'tRNS':
+            info['has_transparency'] = True
+        elif chunk_type == b'IDAT':
+            data.append(chunk)
+        elif chunk_type == b'IEND':
+            break
+        pos += 12 + length
+
+    info['data'] = b''.join(data)
+    return info
+
+
+class PngRowWriter:
+    def __init__(self, path, width, height=0, compress_level=6):
+        """
+        Write an RGB PNG incrementally, one block of rows at a time.
+
+        Rows are filtered with the PNG "Up" filter, which is cheap to compute
+        with NumPy and compresses vertical art well, and deflated as they
+        arrive. The height does not have to be known up front: the header is
+        rewritten with the actual number of rows on close().
+
+        Args:
+            path: Output PNG path
+            width: Image width in pixels
+            height: Expected image height in pixels, if known
+            compress_level: zlib compression level (default: 6)
+        """
+        self.path = path
+        self.width = width
+        self.height = 0
+        self._declared_height = height
+        self._compressor = zlib.compressobj(compress_level)
+        self._previous_row = np.zeros((1, width * 3), dtype=np.uint8)
+
+        self._file = open(path, 'wb')
+        self._file.write(b'\x89PNG\r\n\x1a\n')
+        self._file.write(self._header(height))
+
+    def _header(self, height):
+        return _png_chunk(b'IHDR', struct.pack('>IIBBBBB', self.width, height, 8, 2, 0, 0, 0))
+
+    def write(self, block):
+        """
+        Append rows, an array of shape (rows, width, 3) with dtype uint8.
+        """
+        rows = block.reshape(block.shape[0], self.width * 3)
+        # "Up" filter: difference to the row above, modulo 256
+        filtered = rows - np.concatenate([self._previous_row, rows[:-1]])
+        self._previous_row = rows[-1:]
+        lines = np.concatenate([np.full((rows.shape[0], 1), 2, dtype=np.uint8), filtered], axis=1)
+        data = self._compressor.compress(lines.tobytes())
+        if data:
+            self._file.write(_png_chunk(b'IDAT', data))
+        self.height += rows.shape[0]
+
+    def close(self):
+        """
+        Finish the image, fixing up the header if the height was not known.
+        """
+        self._file.write(_png_chunk(b'IDAT', self._compressor.flush()))
+        self._file.write(_png_chunk(b'IEND', b''))
+        if self.height != self._declared_height:
+            self._file.seek(8)
+            self._file.write(self._header(self.height))
+        self._file.close()
+
+    def abort(self):
+        """
+        Stop writing and delete the incomplete file.
+        """
+        self._file.close()
+        os.remove(self.path)
+
+
+def write_png_rows(path, width, height, row_blocks, compress_level=6):
+    """
+    Write an RGB PNG from blocks of rows without holding the whole image.
+
+    Args:
+        path: Output PNG path
+        width: Image width in pixels
+        height: Image height in pixels
+        row_blocks: Iterable of uint8 arrays of shape (rows, width, 3), top to
+            bottom, adding up to `height` rows
+        compress_level: zlib compression level (default: 6)
+    """
+    writer = PngRowWriter(path, width, height, compress_level)
+    for block in row_blocks:
+        writer.write(block)
+    writer.close()
+
+
+def scaled_size(size, max_width=None):
+    """
+    Size of a page scaled down to `max_width` (never up), keeping its aspect ratio.
+    """
+    width, height = size
+    if not max_width or width <= max_width:
+        return size
+    return max_width, max(1, round(height * max_width / width))
+
+
+def decode_page(path, max_width=None):
+    """
+    Decode an image as RGB, at most `max_width` pixels wide.
+
+    A JPEG is scaled by the decoder itself (draft(), which decodes at 1/2,
+    1/4 or 1/8 of the size), so its full resolution is never in memory. Other
+    formats are decoded in full and shrunk right away by the largest integer
+    factor that stays above the target with reduce(), a cheap box filter. A
+    final Lanczos resize then gives the exact width.
+
+    Args:
+        path: Image path
+        max_width: Widest page wanted (default: None, full size)
+
+    Returns:
+        RGB PIL image
+    """
+    with Image.open(path) as img:
+        target = scaled_size(img.size, max_width)
+        if target == img.size:
+            return img.convert('RGB')
+        if img.format == 'JPEG':
+            img.draft('RGB', target)
+        image = img.convert('RGB')
+
+    factor = min(image.width // target[0], image.height // target[1])
+    if factor >= 2:
+        image = image.reduce(factor)
+    if image.size != target:
+        image = image.resize(target, Image.LANCZOS)
+    return image
+
+
+class ImageStrip:
+    def __init__(self, image, block_rows=4096):
+        """
+        Strip interface over a long image that is already open.
+
+        Args:
+            image: PIL image of the whole strip
+            block_rows: Number of rows converted to an array at a time when scanning
+        """
+        self.image = image
+        self.width, self.height = image.size
+        self.block_rows = block_rows
+
+    def crop(self, top, bottom):
+        """
+        Rows top to bottom of the strip as an RGB image, padded with black past the end.
+        """
+        return self.image.crop((0, top, self.width, bottom))
+
+    def find_uniform_rows(self):
+        """
+        Classify every row as uniformly black or white, block by block.
+
+        Returns:
+            Tuple of boolean arrays (black_rows, white_rows), one entry per row
+        """
+        black_blocks, white_blocks = [np.zeros(0, dtype=bool)], [np.zeros(0, dtype=bool)]
+        for top in range(0, self.height, self.block_rows):
+            block = self.image.crop((0, top, self.width, min(self.height, top + self.block_rows)))
+            black_rows, white_rows = uniform_row_masks(np.asarray(block.convert('RGB')))
+            black_blocks.append(black_rows)
+            white_blocks.append(white_rows)
+
+        return np.concatenate(black_blocks), np.concatenate(white_blocks)
+
+
+class VirtualStrip:
+    def __init__(self, image_paths, cached_pages=2, max_width=None, on_decode=None):
+        """
+        Long strip made of the ordered source pages, without ever building it.
+
+        Only the image headers are read up front. A row-offset index maps a
+        global row to (page, local row), and pages are decoded on demand when a
+        crop or scan needs them, so memory is bounded by a few pages instead of
+        the whole chapter. The layout matches the pasted long image: pages are
+        left-aligned on a black canvas as wide as the widest page.
+
+        Args:
+            image_paths: Paths of the pages, top to bottom
+            cached_pages: Number of decoded pages kept for crops spanning pages
+            max_width: Pages wider than this are decoded scaled down to it
+                (see decode_page) (default: None, full size)
+            on_decode: Optional callable invoked with (page index, RGB image)
+                the first time each page is decoded
+        """
+        self.image_paths = list(image_paths)
+        self.cached_pages = cached_pages
+        self.max_width = max_width
+        self.on_decode = on_decode
+        self._seen = set()
+        self._cache = {}  # page index -> decoded RGB image, most recent last
+        self.decoded_pages = 0  # pages decoded so far, counting re-decodes of evicted pages
+
+        self.sizes = []
+        for image_path in self.image_paths:
+            with Image.open(image_path) as img:
+                self.sizes.append(scaled_size(img.size, max_width))
+
+        # Global row where each page starts
+        self.offsets = []
+        top = 0
+        for _, page_height in self.sizes:
+            self.offsets.append(top)
+            top += page_height
+
+        self.width = max((width for width, _ in self.sizes), default=0)
+        self.height = top
+
+    def locate(self, y):
+        """
+        Map a global row to (page index, row within that page).
+        """
+        index = bisect_right(self.offsets, y) - 1
+        return index, y - self.offsets[index]
+
+    def page(self, index):
+        """
+        Decode a page as RGB, keeping the last `cached_pages` pages around.
+        """
+        page = self._cache.pop(index, None)
+        if page is None:
+            page = decode_page(self.image_paths[index], self.max_width)
+            self.decoded_pages += 1
+            if self.on_decode is not None and index not in self._seen:
+                self._seen.add(index)
+                self.on_decode(index, page)
+        self._cache[index] = page
+        while len(self._cache) > self.cached_pages:
+            del self._cache[next(iter(self._cache))]
+        return page
+
+    def crop(self, top, bottom):
+        """
+        Rows top to bottom of the strip as an RGB image, padded with black past the end.
+
+        Slices that span page boundaries are assembled from the pages they overlap.
+        """
+        slice_image = Image.new("RGB", (self.width, bottom - top))
+        if top >= self.height:
+            return slice_image
+
+        index, _ = self.locate(top)
+        while index < len(self.sizes) and self.offsets[index] < bottom:
+            page_top = self.offsets[index]
+            page_height = self.sizes[index][1]
+            if page_top + page_height > top:
+                local_top = max(0, top - page_top)
+                local_bottom = min(page_height, bottom - page_top)
+                part = self.page(index).crop((0, local_top, self.sizes[index][0], local_bottom))
+                slice_image.paste(part, (0, page_top + local_top - top))
+            index += 1
+
+        return slice_image
+
+    def iter_row_blocks(self):
+        """
+        Yield the strip page by page as uint8 arrays of shape (rows, width, 3).
+        """
+        for index, (page_width, page_height) in enumerate(self.sizes):
+            pixels = np.asarray(self.page(index))
+            if page_width < self.width:
+                padded = np.zeros((page_height, self.width, 3), dtype=np.uint8)
+                padded[:, :page_width] = pixels
+                pixels = padded
+            yield pixels
+
+    def find_uniform_rows(self):
+        """
+        Classify every row as uniformly black or white, page by page.
+
+        Rows of pages narrower than the strip end in black padding, so they
+        can be black but never white.
+
+        Returns:
+            Tuple of boolean arrays (black_rows, white_rows), one entry per row
+        """
+        black_blocks, white_blocks = [np.zeros(0, dtype=bool)], [np.zeros(0, dtype=bool)]
+        for index, (page_width, _) in enumerate(self.sizes):
+            black_rows, white_rows = uniform_row_masks(np.asarray(self.page(index)))
+            if page_width < self.width:
+                white_rows = np.zeros_like(white_rows)
+            black_blocks.append(black_rows)
+            white_blocks.append(white_rows)
+
+        return np.concatenate(black_blocks), np.concatenate(white_blocks)
+
+    def save_png(self, path, compress_level=6):
+        """
+        Stream the strip to a PNG file one page at a time.
+        """
+        write_png_rows(path, self.width, self.height, self.iter_row_blocks(), compress_level)
+
+
+class MemmapStrip:
+    def __init__(self, pixels, block_rows=4096):
+        """
+        Strip backed by one uncompressed RGB buffer, usually a numpy.memmap file.
+
+        The operating system pages the buffer in and out as needed, so very
+        tall chapters do not have to fit in RAM, and several stages can share
+        the pixels without decoding and re-encoding a PNG in between. Rows are
+        read as zero-copy views of the buffer.
+
+        Args:
+            pixels: Array of shape (height, width, 3) with dtype uint8
+            block_rows: Number of rows handled at a time when scanning or saving
+        """
+        self.pixels = pixels
+        self.height, self.width = pixels.shape[:2]
+        self.block_rows = block_rows
+
+    @classmethod
+    def create(cls, path, width, height):
+        """
+        Create a black strip of the given size in a new .npy memmap file.
+        """
+        return cls(np.lib.format.open_memmap(path, mode='w+', dtype=np.uint8, shape=(height, width, 3)))
+
+    @classmethod
+    def open(cls, path):
+        """
+        Open an existing .npy memmap file read-only.
+        """
+        return cls(np.load(path, mmap_mode='r'))
+
+    def rows(self, top, bottom):
+        """
+        Rows top to bottom as an array, padded with black past the end.
+
+        Returns a view of the buffer unless padding is needed.
+        """
+        if bottom <= self.height:
+            return self.pixels[top:bottom]
+        padded = np.zeros((bottom - top, self.width, 3), dtype=np.uint8)
+        if top < self.height:
+            padded[:self.height - top] = self.pixels[top:]
+        return padded
+
+    def crop(self, top, bottom):
+        """
+        Rows top to bottom of the strip as an RGB image, padded with black past the end.
+        """
+        return Image.fromarray(np.ascontiguousarray(self.rows(top, bottom)), "RGB")
+
+    def iter_row_blocks(self, top=0, bottom=None):
+        """
+        Yield rows top to bottom in blocks of `block_rows` rows.
+        """
+        bottom = self.height if bottom is None else bottom
+        for block_top in range(top, bottom, self.block_rows):
+            yield self.rows(block_top, min(bottom, block_top + self.block_rows))
+
+    def find_uniform_rows(self):
+        """
+        Classify every row as uniformly black or white, block by block.
+
+        Returns:
+            Tuple of boolean arrays (black_rows, white_rows), one entry per row
+        """
+        black_blocks, white_blocks = [np.zeros(0, dtype=bool)], [np.zeros(0, dtype=bool)]
+        for block in self.iter_row_blocks():
+            black_rows, white_rows = uniform_row_masks(block)
+            black_blocks.append(black_rows)
+            white_blocks.append(white_rows)
+
+        return np.concatenate(black_blocks), np.concatenate(white_blocks)
+
+    def save_png(self, path, compress_level=6):
+        """
+        Stream the strip to a PNG file straight from the buffer.
+        """
+        write_png_rows(path, self.width, self.height, self.iter_row_blocks(), compress_level)
+
+    def flush(self):
+        """
+        Write pending changes of a memmap buffer to its file.
+        """
+        if isinstance(self.pixels, np.memmap):
+            self.pixels.flush()
+
+    def close(self):
+        """
+        Release the buffer so its file can be deleted.
+        """
+        self.flush()
+        self.pixels = None
+
+
+class StreamingSlicer:
+    def __init__(self, page_height, min_height, on_slice, band_height=5):
+        """
+        Cut a strip into slices while its pages are still arriving.
+
+        Pages are added top to bottom with add_page(). As soon as the rows
+        seen so far decide where the next cut goes, the slice is handed to
+        `on_slice` and its rows are dropped, so only the rows from the top of
+        the current slice onward are kept. The cuts are the same as
+        plan_slices over the whole strip.
+
+        The strip is as wide as the widest page seen so far; narrower pages
+        are padded with black. If a later page is wider than the ones before
+        it, slices already emitted keep their narrower width.
+
+        Args:
+            page_height: Height a slice has to reach before it may be cut
+            min_height: Minimum slice height
+            on_slice: Callable taking (slice_number, pixels) for every slice,
+                pixels being a uint8 array of shape (rows, width, 3)
+            band_height: Number of rows in a black or white band (default: 5)
+        """
+        self.page_height = page_height
+        self.min_height = min_height
+        self.on_slice = on_slice
+        self.band_height = band_height
+
+        self.width = 0
+        self.height = 0  # Rows received so far
+        self.current_height = 0  # Top of the next slice
+        self.slice_count = 0
+        self.black_rows = np.zeros(0, dtype=bool)
+        self.white_rows = np.zeros(0, dtype=bool)
+
+        self._blocks = []  # (top, pixels) of the rows not emitted yet
+        self._checked_to = 0  # Rows before this are known not to start a band
+
+    def add_page(self, pixels):
+        """
+        Add the next page, an RGB array of shape (rows, width, 3), and emit
+        every slice that can be decided.
+        """
+        page_height, page_width = pixels.shape[:2]
+        self.width = max(self.width, page_width)
+
+        black_rows, white_rows = uniform_row_masks(pixels)
+        if page_width < self.width:
+            white_rows = np.zeros_like(white_rows)  # Black padding on the right
+        self.black_rows = np.concatenate([self.black_rows, black_rows])
+        self.white_rows = np.concatenate([self.white_rows, white_rows])
+
+        self._blocks.append((self.height, pixels))
+        self.height += page_height
+
+        while True:
+            slice_height = self._next_slice_height(final=False)
+            if slice_height is None:
+                break
+            self._emit(slice_height)
+
+    def finish(self):
+        """
+        Emit the remaining slices once all pages have been added.
+
+        Returns:
+            Number of slices emitted in total
+        """
+        while self.current_height < self.height:
+            self._emit(self._next_slice_height(final=True))
+        return self.slice_count
+
+    def _next_slice_height(self, final):
+        """
+        Height of the next slice, or None if more rows are needed to decide it.
+        """
+        search_top = self.current_height + self.page_height
+
+        if final:
+            # Same rule as plan_slices, with bands padded past the end
+            slice_height = self.height - self.current_height
+            if slice_height > self.page_height:
+                starts = find_band_starts(self.black_rows[search_top:], self.white_rows[search_top:],
+                                          self.band_height)
+                if len(starts):
+                    slice_height = self.page_height + int(starts[0])
+            return max(slice_height, self.min_height)
+
+        # Only bands that lie completely within the rows seen so far can be judged
+        search_from = max(search_top, self._checked_to)
+        if search_from + self.band_height > self.height:
+            return None
+
+        starts = find_band_starts(self.black_rows[search_from:], self.white_rows[search_from:],
+                                  self.band_height, pad_end=False)
+        if not len(starts):
+            self._checked_to = self.height - self.band_height + 1
+            return None
+
+        cut = search_from + int(starts[0])
+        self._checked_to = cut
+        slice_height = max(cut - self.current_height, self.min_height)
+        if self.current_height + slice_height > self.height:
+            return None  # The minimum height reaches past the rows seen so far
+        return slice_height
+
+    def _emit(self, slice_height):
+        """
+        Hand rows current_height to current_height + slice_height to on_slice.
+        """
+        top = self.current_height
+        bottom = top + slice_height
+        pixels = np.zeros((slice_height, self.width, 3), dtype=np.uint8)  # Black past the end
+
+        for block_top, block in self._blocks:
+            block_bottom = block_top + block.shape[0]
+            if block_bottom <= top or block_top >= bottom:
+                continue
+            start, end = max(top, block_top), min(bottom, block_bottom)
+            pixels[start - top:end - top, :block.shape[1]] = block[start - block_top:end - block_top]
+
+        # Rows above the next slice are no longer needed
+        self._blocks = [(block_top, block) for block_top, block in self._blocks
+                        if block_top + block.shape[0] > bottom]
+
+        self.on_slice(self.slice_count, pixels)
+        self.slice_count += 1
+        self.current_height = bottom
@@ -0,0 +1,210 @@
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class WatchState:
+    def __init__(self, path):
+        """
+        SQLite file recording, per series, the next chapter to look for and
+        when to look again, and the outcome of every chapter found.
+
+        Every change is committed at once, so a watcher that is stopped or
+        crashes resumes where it left off: known chapters are never probed
+        again, and chapters that were found but not finished are processed
+        after the restart.
+
+        Args:
+            path: Path of the state file
+        """
+        self.path = path
+        folder = os.path.dirname(os.path.abspath(path))
+        os.makedirs(folder, exist_ok=True)
+
+        with self._connect() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS series ('
+                               'name TEXT PRIMARY KEY, next_chapter INTEGER, next_check REAL)')
+            connection.execute('CREATE TABLE IF NOT EXISTS chapters ('
+                               'series TEXT, chapter INTEGER, status TEXT, attempts INTEGER, '
+                               'final_pdf TEXT, error TEXT, updated REAL, PRIMARY KEY (series, chapter))')
+
+    @contextmanager
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def add_series(self, name, first_chapter):
+        """
+        Start tracking a series at `first_chapter`; a tracked series keeps its state.
+        """
+        with self._connect() as connection:
+            connection.execute('INSERT OR IGNORE INTO series (name, next_chapter, next_check) VALUES (?, ?, 0)',
+                               (name, int(first_chapter)))
+
+    def next_chapter(self, name):
+        """Number of the first chapter of the series not found yet."""
+        with self._connect() as connection:
+            return connection.execute('SELECT next_chapter FROM series WHERE name = ?', (name,)).fetchone()[0]
+
+    def next_check(self, name):
+        """Time (epoch seconds) the series is due to be probed again."""
+        with self._connect() as connection:
+            return connection.execute('SELECT next_check FROM series WHERE name = ?', (name,)).fetchone()[0]
+
+    def schedule(self, name, next_check):
+        """Set when the series is probed again."""
+        with self._connect() as connection:
+            connection.execute('UPDATE series SET next_check = ? WHERE name = ?', (next_check, name))
+
+    def add_chapter(self, name, chapter):
+        """
+        Record a newly found chapter as queued and move the series past it.
+        """
+        with self._connect() as connection:
+            connection.execute('INSERT OR IGNORE INTO chapters (series, chapter, status, attempts, updated) '
+                               'VALUES (?, ?, ?, 0, ?)', (name, chapter, 'queued', time.time()))
+            connection.execute('UPDATE series SET next_chapter = MAX(next_chapter, ?) WHERE name = ?',
+                               (chapter + 1, name))
+
+    def pending(self, name, max_attempts):
+        """
+        Chapters of a series that still have to be processed: queued ones and
+        failed ones with attempts left, in chapter order.
+        """
+        with self._connect() as connection:
+            rows = connection.execute("SELECT chapter FROM chapters WHERE series = ? AND "
+                                      "(status = 'queued' OR (status = 'failed' AND attempts < ?)) "
+                                      "ORDER BY chapter", (name, max_attempts)).fetchall()
+        return [row[0] for row in rows]
+
+    def finish(self, name, chapter, result):
+        """
+        Record the result of process_single_chapter for a chapter.
+        """
+        with self._connect() as connection:
+            connection.execute('UPDATE chapters SET status = ?, attempts = attempts + 1, final_pdf = ?, '
+                               'error = ?, updated = ? WHERE series = ? AND chapter = ?',
+                               ('done' if result['ok'] else 'failed', result.get('final_pdf'),
+                                result.get('error'), time.time(), name, chapter))
+
+    def chapters(self, name):
+        """
+        All recorded chapters of a series as dictionaries, in chapter order.
+        """
+        with self._connect() as connection:
+            connection.row_factory = sqlite3.Row
+            rows = connection.execute('SELECT chapter, status, attempts, final_pdf, error, updated FROM chapters '
+                                      'WHERE series = ? ORDER BY chapter', (name,)).fetchall()
+        return [dict(row) for row in rows]
+
+
+class ChapterWatcher:
+    def __init__(self, state, series, probe, process, interval=3600, workers=1, max_attempts=3,
+                 result_of=None):
+        """
+        Poll series for new chapters and process them as they appear.
+
+        A series that is due is asked for its next chapter with `probe`, which
+        should be cheap (a HEAD request for the chapter's first image). Every
+        chapter found is recorded in the state and handed to a pool of
+        `workers` processes, and the following chapter is probed straight away,
+        so a backlog of releases is caught up in one check. Once the next
+        chapter is missing, the series is checked again after `interval`
+        seconds. Failed chapters are retried at the next checks of their
+        series, up to `max_attempts` times.
+
+        Args:
+            state: WatchState the progress is recorded in
+            series: Dictionary of series name to its configuration
+            probe: Callable (configuration, chapter number) returning whether
+                the chapter is online
+            process: Callable (configuration, chapter number as a string)
+                returning a result dictionary like process_single_chapter; run
+                in worker processes, so it must be picklable
+            interval: Seconds between checks of a series (default: 3600)
+            workers: Chapters processed in parallel (default: 1)
+            max_attempts: Times a failing chapter is tried (default: 3)
+            result_of: Callable (future, chapter number as a string) returning
+                the result of a finished chapter, also if its worker process
+                died, like run_processor.chapter_result (default: the future's
+                result)
+        """
+        self.state = state
+        self.series = series
+        self.probe = probe
+        self.process = process
+        self.interval = interval
+        self.workers = max(1, int(workers))
+        self.max_attempts = max_attempts
+        self.result_of = result_of or (lambda future, chapter: future.result())
+
+    def _new_chapters(self, name, config):
+        """
+        Probe the chapters after the last known one until one is missing.
+        """
+        chapter = self.state.next_chapter(name)
+        while self.probe(config, chapter):
+            logger.info(f"New chapter found: {name} chapter {chapter}")
+            self.state.add_chapter(name, chapter)
+            chapter += 1
+        return chapter
+
+    def run(self, once=False):
+        """
+        Watch until interrupted.
+
+        Args:
+            once: Check every series once, process what was found and return,
+                e.g. when started by a scheduler (default: False)
+        """
+        for name, config in self.series.items():
+            self.state.add_series(name, config.get('chapter_number', 0))
+
+        running = {}  # future -> (series name, chapter)
+        checked = False
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            while True:
+                if not (once and checked):
+                    now = time.time()
+                    for name, config in self.series.items():
+                        if not once and self.state.next_check(name) > now:
+                            continue
+                        next_chapter = self._new_chapters(name, config)
+                        self.state.schedule(name, now + self.interval)
+                        logger.debug(f"No chapter {next_chapter} of {name} yet")
+
+                        in_progress = {chapter for series, chapter in running.values() if series == name}
+                        for chapter in self.state.pending(name, self.max_attempts):
+                            if chapter not in in_progress:
+                                future = executor.submit(self.process, config, str(chapter))
+                                running[future] = (name, chapter)
+                    checked = True
+
+                if once and not running:
+                    return
+
+                timeout = None if once else max(0.0, min(self.state.next_check(name) for name in self.series)
+                                                  - time.time())
+                if not running:
+                    logger.info(f"Next check in {timeout / 60:.0f} minutes")
+                    time.sleep(timeout)
+                    continue
+
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, chapter = running.pop(future)
+                    result = self.result_of(future, str(chapter))
+                    self.state.finish(name, chapter, result)
+                    if result['ok']:
+                        logger.info(f"✅ {name} chapter {chapter}: {result['final_pdf']}")
+                    else:
+                        logger.error(f"❌ {name} chapter {chapter}: {result['error']}")
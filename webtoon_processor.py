@@ -1,39 +1,564 @@
 import os
+import re
 import sys
+import io
+import copy
+import json
+import hashlib
+import importlib.util
+import logging
+import tempfile
 import requests
 import fitz  # PyMuPDF
 from PIL import Image, ImageChops
 from reportlab.lib.pagesizes import A4
 import shutil
+import queue
+import threading
+from bisect import bisect_left
+from collections import deque
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+from http_client import HttpClient
+from manifest import ChapterManifest, file_sha256
+from metrics import ChapterMetrics
+from strips import (ImageStrip, MemmapStrip, PngRowWriter, StreamingSlicer, VirtualStrip, decode_page, scaled_size,
+                    find_band_starts, read_png_stream)
+
+logger = logging.getLogger(__name__)
+
+# Leading bytes of the image formats webtoon hosts serve
+IMAGE_SIGNATURES = {
+    'png': b'\x89PNG\r\n\x1a\n',
+    'jpeg': b'\xff\xd8\xff',
+    'gif': b'GIF8',
+    'webp': b'RIFF',
+}
+
+# Bytes at the end of an image file searched for its end marker, allowing for padding
+IMAGE_TAIL_BYTES = 4096
+
+# PNG color types that map straight onto a PDF color space
+PNG_COLOR_SPACES = {0: ('/DeviceGray', 1), 2: ('/DeviceRGB', 3)}
+
+# File extensions of downloaded pages and slices that can be read back
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.gif', '.avif')
+
+# Slice formats: PIL format name, file extension and largest width or height the format can store
+SLICE_FORMATS = {
+    'png': ('PNG', '.png', None),
+    'jpeg': ('JPEG', '.jpg', 65500),
+    'webp': ('WEBP', '.webp', 16383),
+    'avif': ('AVIF', '.avif', 32768),
+}
+
+# Encodings for re-encoded PDF page images: PIL format name
+PDF_IMAGE_FORMATS = {'jpeg': 'JPEG', 'png': 'PNG'}
+
+# Processor settings an output profile can override, besides its page height and width
+PROFILE_SETTINGS = ('slice_format', 'slice_quality', 'png_compress_level', 'pdf_image_format',
+                    'pdf_image_quality')
+
+# RAM-backed filesystem used for scratch folders when it has room for a chapter
+TMPFS_FOLDER = '/dev/shm'
+TMPFS_MIN_FREE = 1024 ** 3
+
+def default_scratch_folder(base_folder):
+    """
+    Scratch folder for the intermediates of a base folder in ephemeral mode.
+    
+    Uses the RAM-backed /dev/shm if it exists and has at least 1 GiB free
+    (containers often limit it to 64 MiB), otherwise the system temp folder.
+    The name is derived from the base folder, so runs for the same output
+    folder share their scratch space.
+    
+    Returns:
+        Path of the scratch folder (not created)
+    """
+    root = tempfile.gettempdir()
+    if os.path.isdir(TMPFS_FOLDER) and os.access(TMPFS_FOLDER, os.W_OK):
+        if shutil.disk_usage(TMPFS_FOLDER).free >= TMPFS_MIN_FREE:
+            root = TMPFS_FOLDER
+    
+    base_folder = os.path.abspath(base_folder)
+    digest = hashlib.sha1(base_folder.encode('utf-8')).hexdigest()[:12]
+    return os.path.join(root, "webtoon_processor", f"{os.path.basename(base_folder)}-{digest}")
+
+def is_complete_image(image_path):
+    """
+    Check the magic bytes of an image file and, where the format has one,
+    that its end marker is present, so truncated downloads are caught early.
+    
+    The end marker may be followed by padding, so it is looked for in the
+    last IMAGE_TAIL_BYTES of the file. Formats without a check here (AVIF,
+    BMP, ...) count as complete; the Content-Length check of the download
+    still applies to them.
+    """
+    size = os.path.getsize(image_path)
+    with open(image_path, 'rb') as file:
+        head = file.read(16)
+        file.seek(max(0, size - IMAGE_TAIL_BYTES))
+        tail = file.read()
+    
+    if head.startswith(IMAGE_SIGNATURES['png']):
+        return b'IEND\xaeB`\x82' in tail
+    if head.startswith(IMAGE_SIGNATURES['jpeg']):
+        return b'\xff\xd9' in tail
+    if head.startswith(IMAGE_SIGNATURES['gif']):
+        return tail.rstrip(b'\x00').endswith(b';')
+    if head.startswith(IMAGE_SIGNATURES['webp']) and head[8:12] == b'WEBP':
+        # RIFF header stores the size of everything after its first 8 bytes
+        return int.from_bytes(head[4:8], 'little') + 8 <= size
+    return True
+
+def mask_to_runs(mask):
+    """
+    Run-length encode a boolean row mask as a list of [start, length] spans of True rows.
+    """
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], mask.astype(np.int8), [0]])))
+    return [[int(start), int(end - start)] for start, end in zip(edges[::2], edges[1::2])]
+
+def runs_to_mask(runs, length):
+    """
+    Expand [start, length] spans from mask_to_runs back into a boolean row mask.
+    """
+    mask = np.zeros(length, dtype=bool)
+    for start, run_length in runs:
+        mask[start:start + run_length] = True
+    return mask
+
+def plan_slices(gutter_rows, img_height, page_height, min_height):
+    """
+    Work out where format_png cuts a strip, as a pure lookup over the gutter rows.
+    
+    Each slice runs up to the first black or white band at least `page_height`
+    rows below its top (or to the end of the strip) and is at least
+    `min_height` rows tall.
+    
+    Args:
+        gutter_rows: Sorted row indices where a black or white band starts
+        img_height: Height of the strip in pixels
+        page_height: Height a slice has to reach before it may be cut
+        min_height: Minimum slice height
+    
+    Returns:
+        List of (top, height) tuples, one per slice
+    """
+    slices = []
+    current_height = 0
+    
+    while current_height < img_height:
+        # Start with the maximum possible slice height
+        slice_height = img_height - current_height
+        
+        # Find the next black band if the height exceeds the page height
+        if slice_height > page_height:
+            index = bisect_left(gutter_rows, current_height + page_height)
+            if index < len(gutter_rows):
+                slice_height = int(gutter_rows[index]) - current_height
+        
+        # Ensure slice height is not less than the minimum height
+        slice_height = max(slice_height, min_height)
+        
+        slices.append((current_height, slice_height))
+        current_height += slice_height
+    
+    return slices
+
+class PipelineAborted(Exception):
+    """Raised inside a pipeline stage when another stage has failed."""
+
+def _put_unless_stopped(stage_queue, item, stop):
+    """
+    Put an item on a bounded queue, blocking for space (backpressure) but
+    giving up with PipelineAborted once another stage has failed.
+    """
+    while True:
+        if stop.is_set():
+            raise PipelineAborted()
+        try:
+            stage_queue.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            continue
+
+def _get_unless_stopped(stage_queue, stop):
+    """
+    Take an item from a queue, giving up with PipelineAborted once another
+    stage has failed and nothing is left to take.
+    """
+    while True:
+        try:
+            return stage_queue.get(timeout=0.1)
+        except queue.Empty:
+            if stop.is_set():
+                raise PipelineAborted()
+
+def _save_image(image, path, image_format, options, size=None):
+    """
+    Encode an image, scaled to `size` if given, and release its pixels. Runs
+    on the encoder pool; PIL releases the GIL while resampling and encoding,
+    so encoders run in parallel.
+    """
+    with image:
+        if size is not None and size != image.size:
+            image = image.resize(size, Image.LANCZOS)
+        if image_format != 'PNG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        image.save(path, image_format, **options)
+
+def mupdf_can_linearize():
+    """
+    Whether the MuPDF library under PyMuPDF can write linearized PDFs (before 1.26).
+    """
+    version = tuple(int(part) for part in re.findall(r'\d+', fitz.VersionFitz)[:2])
+    return version < (1, 26)
+
+def save_web_pdf(pdf_document, path):
+    """
+    Save a PyMuPDF document for fast first-page display in web readers.
+    
+    Identical objects, such as the image streams of repeated blank slices,
+    are merged into one, unused objects are dropped and all streams are
+    compressed. If pikepdf is installed, qpdf then linearizes the file (fast
+    web view) and packs its objects into compressed object streams. Without
+    it, MuPDF before 1.26 linearizes the file itself, but cannot add object
+    streams (PyMuPDF before 1.24 has no use_objstms), and MuPDF 1.26 and
+    later writes object streams but dropped linearization.
+    
+    Returns:
+        True if the PDF was linearized
+    """
+    try:
+        import pikepdf
+    except ImportError:
+        if mupdf_can_linearize():
+            pdf_document.save(path, garbage=4, deflate=True, linear=True)
+            return True
+        pdf_document.save(path, garbage=4, deflate=True, use_objstms=1)
+        return False
+    
+    temp_path = path + '.tmp'
+    pdf_document.save(temp_path, garbage=4, deflate=True)
+    try:
+        with pikepdf.open(temp_path) as pdf:
+            pdf.save(path, linearize=True, object_stream_mode=pikepdf.ObjectStreamMode.generate)
+    finally:
+        os.remove(temp_path)
+    return True
+
+def check_profiles(profiles):
+    """
+    Validate the output profiles of process_chapter.
+    
+    A profile is a dictionary with a unique 'name' (used in the file names),
+    optional 'page_height' and 'min_height' in output pixels (default: A4
+    height at 72 dpi), an optional 'width' the slices are scaled to (default:
+    the width of the strip), and any of PROFILE_SETTINGS, which default to
+    the processor's settings. A profile's slice format has to be writable by
+    this Pillow build, so a bad profile fails before anything is decoded.
+    
+    Raises:
+        ValueError: If a profile is invalid
+    """
+    Image.init()
+    names = set()
+    for profile in profiles:
+        name = str(profile.get('name') or '')
+        if not re.fullmatch(r'[\w-]+', name):
+            raise ValueError(f"Output profile names may only contain letters, digits, '_' and '-', got '{name}'")
+        if name in names:
+            raise ValueError(f"Output profile '{name}' is listed twice")
+        names.add(name)
+        
+        unknown = set(profile) - {'name', 'page_height', 'min_height', 'width'} - set(PROFILE_SETTINGS)
+        if unknown:
+            raise ValueError(f"Unknown settings in output profile '{name}': {', '.join(sorted(unknown))}")
+        slice_format = profile.get('slice_format', 'png')
+        if slice_format not in SLICE_FORMATS:
+            raise ValueError(f"Unknown slice format '{slice_format}' in output profile '{name}'")
+        if SLICE_FORMATS[slice_format][0] not in Image.SAVE:
+            raise ValueError(f"This Pillow build cannot write {slice_format} images (output profile '{name}')")
+        if profile.get('pdf_image_format', 'jpeg') not in PDF_IMAGE_FORMATS:
+            raise ValueError(f"Unknown PDF image format '{profile['pdf_image_format']}' in output profile '{name}'")
+
+def profile_chapter(chapter_number, profile):
+    """
+    Chapter name the outputs of a profile are written under, e.g. "12_phone"
+    for FormattedPNGs/Chapter12_phone and FinalPDFs/Chapter12_phone_Final.pdf.
+    """
+    return f"{chapter_number}_{profile['name']}"
 
 class WebtoonProcessor:
-    def __init__(self, base_folder):
+    def __init__(self, base_folder, max_concurrency=1, discover_range=False, http_client=None,
+                 use_memmap=False, pdf_passthrough=False, resume=False, encode_workers=None,
+                 png_compress_level=6, png_optimize=False, fast_intermediates=False,
+                 scratch_folder=None, slice_format='png', slice_quality=None,
+                 pdf_image_format='jpeg', pdf_image_quality=None, image_cache=None,
+                 metrics_folder=None, metrics_format='json', profile_folder=None,
+                 strip_width=None, preview_width=None, pdf_fast_web_view=False):
         """
         Initialize the WebtoonProcessor with a base folder for all operations.
         
         Args:
             base_folder: The main folder to store all processed files
+            max_concurrency: Number of images downloaded in parallel (default: 1)
+            discover_range: Whether to find the last image with HEAD probes before
+                downloading instead of waiting for consecutive failures (default: False)
+            http_client: Shared HttpClient for all downloads; one with default
+                timeouts and retries is created if not given
+            use_memmap: Whether pdf_to_long_image / images_to_long_image and
+                format_png share the chapter's pixels through a memory-mapped
+                file instead of an in-memory image (default: False)
+            pdf_passthrough: Whether PDFs embed the compressed data of JPEG and
+                PNG files as is instead of re-encoding them (default: False)
+            resume: Whether process_chapter records completed stages in a per-chapter
+                manifest and skips stages whose inputs did not change (default: False)
+            encode_workers: Number of threads encoding slices in parallel
+                (default: number of CPUs)
+            png_compress_level: zlib level for PNG slices, 0-9 (default: 6, as PIL)
+            png_optimize: Whether PIL searches for the smallest PNG encoding of
+                each slice, which is much slower (default: False)
+            fast_intermediates: Whether slices deleted by cleanup are written
+                with the fastest compression instead (default: False)
+            scratch_folder: Folder for the intermediates that cleanup deletes (raw
+                images, merged PDF, slices), e.g. on a tmpfs, so that only the long
+                PNG, the final PDF and the manifests are written to base_folder
+                (default: base_folder)
+            slice_format: Format of the slices, one of SLICE_FORMATS (default: 'png').
+                Slices taller or wider than the format allows are written as PNG.
+            slice_quality: Quality of lossy slice formats, 1-100 (default: PIL's
+                default for the format)
+            pdf_image_format: Encoding of PDF pages that are not passed through,
+                'jpeg' or lossless 'png' (default: 'jpeg')
+            pdf_image_quality: JPEG quality of PDF pages, 1-100 (default: 75, as PIL)
+            image_cache: Shared ImageCache that downloads are revalidated against
+                and stored in, so images deleted by cleanup are not fetched again
+                (default: None, no cache)
+            metrics_folder: Folder process_chapter writes each chapter's stage
+                timings and counters to (default: None, not written)
+            metrics_format: 'json' (ChapterN.metrics.json) or 'prometheus'
+                (ChapterN.prom, for node_exporter's textfile collector) (default: 'json')
+            profile_folder: If given, every stage of process_chapter runs under
+                cProfile and its statistics are saved there (default: None)
+            strip_width: Width of the long strip; wider pages are decoded scaled
+                down to it (JPEG pages by the decoder itself, see
+                strips.decode_page) and PDF pages rendered at that width
+                (default: None, native width)
+            preview_width: If given, every page decoded for the long strip is
+                also saved as a JPEG preview this wide in Previews/ChapterN, and
+                the top of the first page as the chapter cover (default: None)
+            pdf_fast_web_view: Whether final PDFs are saved for fast first-page
+                display: deduplicated, garbage-collected, with object streams
+                and, if pikepdf is installed, linearized (default: False)
         """
+        if slice_format not in SLICE_FORMATS:
+            raise ValueError(f"Unknown slice format '{slice_format}', expected one of {', '.join(SLICE_FORMATS)}")
+        Image.init()
+        if SLICE_FORMATS[slice_format][0] not in Image.SAVE:
+            raise ValueError(f"This Pillow build cannot write {slice_format} images")
+        if pdf_image_format not in PDF_IMAGE_FORMATS:
+            raise ValueError(f"Unknown PDF image format '{pdf_image_format}', expected one of "
+                             f"{', '.join(PDF_IMAGE_FORMATS)}")
+        if metrics_format not in ('json', 'prometheus'):
+            raise ValueError(f"Unknown metrics format '{metrics_format}', expected 'json' or 'prometheus'")
+        
         self.base_folder = base_folder
-        self.raw_folder = os.path.join(base_folder, "RawChapters")
-        self.pdf_folder = os.path.join(base_folder, "PDFs")
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.discover_range = discover_range
+        self.http = http_client or HttpClient(pool_size=self.max_concurrency)
+        self.image_cache = image_cache
+        self.use_memmap = use_memmap
+        self.pdf_passthrough = pdf_passthrough
+        self.resume = resume
+        self.encode_workers = max(1, int(encode_workers or os.cpu_count() or 1))
+        self.png_compress_level = png_compress_level
+        self.png_optimize = png_optimize
+        self.fast_intermediates = fast_intermediates
+        self.slice_format = slice_format
+        self.slice_quality = slice_quality
+        self.pdf_image_format = pdf_image_format
+        self.pdf_image_quality = pdf_image_quality
+        self.metrics_folder = metrics_folder
+        self.metrics_format = metrics_format
+        self.profile_folder = profile_folder
+        self.metrics = ChapterMetrics(profile_folder=profile_folder)
+        self.strip_width = strip_width
+        self.preview_width = preview_width
+        self.pdf_fast_web_view = pdf_fast_web_view
+        if pdf_fast_web_view and importlib.util.find_spec('pikepdf') is None and not mupdf_can_linearize():
+            logger.warning(f"pdf_fast_web_view: pikepdf is not installed and MuPDF {fitz.VersionFitz} cannot "
+                           "linearize, so final PDFs are compacted but readers cannot show the first page "
+                           "early (pip install pikepdf)")
+        self.scratch_folder = scratch_folder or base_folder
+        self.raw_folder = os.path.join(self.scratch_folder, "RawChapters")
+        self.pdf_folder = os.path.join(self.scratch_folder, "PDFs")
         self.long_png_folder = os.path.join(base_folder, "LongPNGs")
-        self.formatted_png_folder = os.path.join(base_folder, "FormattedPNGs")
+        self.formatted_png_folder = os.path.join(self.scratch_folder, "FormattedPNGs")
         self.final_pdf_folder = os.path.join(base_folder, "FinalPDFs")
+        self.manifest_folder = os.path.join(base_folder, "Manifests")
+        self.preview_folder = os.path.join(base_folder, "Previews")
         
         # Create all necessary folders
         for folder in [self.raw_folder, self.pdf_folder, self.long_png_folder, 
                       self.formatted_png_folder, self.final_pdf_folder]:
             os.makedirs(folder, exist_ok=True)
     
-    def download_images(self, base_url, chapter_number, start_num="001"):
+    def _download_image(self, url, output_folder, reuse_existing=False):
+        """
+        Download a single image into the output folder.
+        
+        The image is streamed to a temporary file, checked for its length and
+        image signature, and only then renamed to its final name.
+        
+        Args:
+            url: Full URL of the image
+            output_folder: Folder the image is written to
+            reuse_existing: Whether an image already in the folder is kept instead
+                of being fetched again (default: False)
+        
+        Returns:
+            Path to the downloaded image
+        
+        Raises:
+            requests.RequestException: If the image could not be fetched
+        """
+        # Get the image name and create the file path
+        image_name = url.split('/')[-1]
+        image_path = os.path.join(output_folder, image_name)
+        
+        # Only validated images are ever renamed into place, so an existing one is complete
+        if reuse_existing and os.path.exists(image_path) and is_complete_image(image_path):
+            return image_path
+        
+        if self.image_cache is None:
+            # Stream the image to the output folder
+            self.http.download_file(url, image_path, validate=is_complete_image)
+            self.metrics.add('bytes_downloaded', os.path.getsize(image_path))
+            return image_path
+        
+        # Revalidate a cached copy with a conditional request
+        entry = self.image_cache.lookup(url)
+        headers = self.http.download_file(url, image_path, validate=is_complete_image,
+                                          headers=self.image_cache.conditional_headers(entry))
+        if headers is not None:
+            self.metrics.add('bytes_downloaded', os.path.getsize(image_path))
+            self.image_cache.store(url, image_path, headers)
+            return image_path
+        
+        try:
+            self.image_cache.restore(entry, image_path)  # 304 Not Modified
+            self.metrics.add('images_from_cache')
+        except FileNotFoundError:
+            # Evicted by another process in the meantime, fetch it unconditionally
+            headers = self.http.download_file(url, image_path, validate=is_complete_image)
+            self.metrics.add('bytes_downloaded', os.path.getsize(image_path))
+            self.image_cache.store(url, image_path, headers)
+        return image_path
+    
+    def _probe_image(self, url):
+        """
+        Check whether an image exists without downloading it.
+        
+        Uses a HEAD request, falling back to a one-byte ranged GET for servers
+        that do not allow HEAD.
+        
+        Returns:
+            True if the server has the image, False otherwise
+        """
+        try:
+            response = self.http.head(url, allow_redirects=True)
+            if response.status_code in (405, 501):
+                response = self.http.get(url, headers={'Range': 'bytes=0-0'}, stream=True)
+                response.close()
+            return response.ok
+        except requests.RequestException:
+            return False
+    
+    def chapter_available(self, base_url, start_num="001"):
+        """
+        Check whether a chapter is online by probing its first image, without downloading anything.
+        
+        Args:
+            base_url: URL template with 'XXX' as placeholder for image number
+            start_num: Number of the first image (string), defaults to "001"
+        """
+        return self._probe_image(base_url.replace('XXX', start_num))
+    
+    def discover_image_range(self, base_url, start_num="001", gap_tolerance=4, max_num=999):
+        """
+        Find the number of the last available image of a chapter with probes.
+        
+        Probes step exponentially past the last known image until one is
+        missing, then binary search between the last hit and the first miss.
+        A missing page in the middle can end that search early, so the next
+        `gap_tolerance` numbers after the boundary are probed as well and the
+        search resumes from any of them that exist.
+        
+        Args:
+            base_url: URL template with 'XXX' as placeholder for image number
+            start_num: Starting image number (string), defaults to "001"
+            gap_tolerance: Number of missing images in a row that do not end the chapter
+            max_num: Highest image number the 'XXX' placeholder can hold
+        
+        Returns:
+            Number of the last available image, or start - 1 if none was found
+        """
+        def probe(num):
+            return self._probe_image(base_url.replace('XXX', f'{num:03d}'))
+        
+        start = int(start_num)
+        last = start - 1  # Highest image number known to exist
+        window_start = start  # First number not yet known to be missing
+        
+        while True:
+            # Look past a possible gap for another image
+            window = range(window_start, min(last + 2 + gap_tolerance, max_num + 1))
+            found = next((num for num in window if probe(num)), None)
+            if found is None:
+                return last
+            
+            # Exponential search for a missing image beyond the one found
+            low, high, step = found, None, 1
+            while high is None:
+                candidate = low + step
+                if candidate > max_num:
+                    high = max_num + 1
+                elif probe(candidate):
+                    low, step = candidate, step * 2
+                else:
+                    high = candidate
+            
+            # Binary search for the boundary between low (exists) and high (missing)
+            while high - low > 1:
+                mid = (low + high) // 2
+                if probe(mid):
+                    low = mid
+                else:
+                    high = mid
+            
+            last = low
+            window_start = high + 1
+    
+    def download_images(self, base_url, chapter_number, start_num="001", on_image=None,
+                        reuse_existing=False):
         """
         Task 1: Download images for a specific chapter
         
+        Images are fetched by a pool of `max_concurrency` workers when it is
+        greater than 1, otherwise one at a time. With `discover_range` the last
+        image is found up front by `discover_image_range` and the known range is
+        downloaded, reporting missing images as gaps.
+        
         Args:
             base_url: URL template with 'XXX' as placeholder for image number
             chapter_number: Chapter number for folder naming
             start_num: Starting image number (string), defaults to "001"
+            on_image: Optional callable invoked with the path of every downloaded
+                image, in image order, as soon as it is available
+            reuse_existing: Whether images already in the chapter folder are kept
+                instead of being fetched again (default: False)
         
         Returns:
             Path to the folder containing downloaded images
@@ -42,44 +567,277 @@ class WebtoonProcessor:
         os.makedirs(output_folder, exist_ok=True)
         
         start = int(start_num)
-        current_num = start
         max_failures = 5  # Stop after this many consecutive failures
-        consecutive_failures = 0
         
-        print(f"Starting download of Chapter {chapter_number} from image {start_num}")
-        print("Automatically detecting the last available image...")
+        logger.info(f"Starting download of Chapter {chapter_number} from image {start_num}")
+        
+        if self.discover_range:
+            logger.info("Probing for the last available image...")
+            end_num = self.discover_image_range(base_url, start_num, gap_tolerance=max_failures - 1)
+            logger.info(f"Found images {start_num} to {end_num:03d}")
+            missing = self._download_range(base_url, output_folder, range(start, end_num + 1), on_image,
+                                          reuse_existing)
+            if missing:
+                logger.warning(f"Missing images (gaps) in Chapter {chapter_number}: {', '.join(f'{num:03d}' for num in missing)}")
+        elif self.max_concurrency > 1:
+            logger.info("Automatically detecting the last available image...")
+            end_num = self._download_images_concurrent(base_url, output_folder, start, max_failures,
+                                                           on_image, reuse_existing)
+        else:
+            logger.info("Automatically detecting the last available image...")
+            end_num = self._download_images_sequential(base_url, output_folder, start, max_failures,
+                                                           on_image, reuse_existing)
+        
+        logger.info(f'Finished downloading Chapter {chapter_number}! Downloaded images from {start_num} to {end_num:03d}')
+        self._log_download_rate(base_url)
+        return output_folder
+    
+    def _log_download_rate(self, base_url):
+        """
+        Log the concurrency and rates the HTTP client settled on for the image host.
+        """
+        if self.http.rate_controller is None:
+            return
+        host = urlsplit(base_url).netloc
+        stats = self.http.rate_controller.report().get(host)
+        if not stats or not stats['requests_per_second']:
+            return
+        logger.info(f"Download rate for {host}: {stats['concurrency']} concurrent requests, "
+                    f"{stats['requests_per_second']:.1f} requests/s, "
+                    f"{stats['bytes_per_second'] / 1024 ** 2:.1f} MiB/s, {stats['throttled']} throttled",
+                    extra={'event': 'download_rate', 'host': host, **stats})
+    
+    def _download_range(self, base_url, output_folder, numbers, on_image=None, reuse_existing=False):
+        """
+        Download a known list of images, in parallel when `max_concurrency` > 1.
+        
+        Returns:
+            List of image numbers that could not be downloaded
+        """
+        urls = [base_url.replace('XXX', f'{num:03d}') for num in numbers]
+        missing = []
+        
+        def fetch(url):
+            try:
+                return self._download_image(url, output_folder, reuse_existing), None
+            except requests.RequestException as e:
+                return None, e
+        
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            for num, url, (image_path, error) in zip(numbers, urls, executor.map(fetch, urls)):
+                if error is None:
+                    logger.debug(f'Downloaded {os.path.basename(image_path)}')
+                    if on_image is not None:
+                        on_image(image_path)
+                else:
+                    logger.warning(f'Failed to download {url}: {error}')
+                    missing.append(num)
+        
+        return missing
+    
+    def _download_images_sequential(self, base_url, output_folder, start, max_failures, on_image=None,
+                                    reuse_existing=False):
+        """
+        Download images one at a time until `max_failures` consecutive failures.
+        
+        Returns:
+            Number of the last image that belongs to the chapter
+        """
+        current_num = start
+        consecutive_failures = 0
         
         while consecutive_failures < max_failures:
             url = base_url.replace('XXX', f'{current_num:03d}')
             
             try:
-                # Fetch the image
-                response = requests.get(url)
-                response.raise_for_status()  # Ensure we got a valid response
-                
-                # Get the image name and create the file path
-                image_name = url.split('/')[-1]
-                image_path = os.path.join(output_folder, image_name)
-                
-                # Save the image to the output folder
-                with open(image_path, 'wb') as file:
-                    file.write(response.content)
-                    
-                print(f'Downloaded {image_name}')
+                image_path = self._download_image(url, output_folder, reuse_existing)
+                logger.debug(f'Downloaded {os.path.basename(image_path)}')
                 consecutive_failures = 0  # Reset failure counter on success
                 current_num += 1
+                if on_image is not None:
+                    on_image(image_path)
             
             except requests.RequestException as e:
                 consecutive_failures += 1
                 if consecutive_failures >= max_failures:
-                    print(f"Reached end of chapter at image {current_num-1:03d} after {max_failures} consecutive failures")
+                    logger.info(f"Reached end of chapter at image {current_num-1:03d} after {max_failures} consecutive failures")
                     break
-                print(f'Failed to download {url}: {e}')
+                logger.info(f'Failed to download {url}: {e}')
                 current_num += 1
         
-        end_num = current_num - consecutive_failures - 1
-        print(f'Finished downloading Chapter {chapter_number}! Downloaded images from {start_num} to {end_num:03d}')
-        return output_folder
+        return current_num - consecutive_failures - 1
+    
+    def _download_images_concurrent(self, base_url, output_folder, start, max_failures, on_image=None,
+                                    reuse_existing=False):
+        """
+        Download images with a bounded pool of worker threads.
+        
+        Up to `max_concurrency` requests are in flight at once, but results are
+        consumed in image order, so the end of the chapter is detected exactly
+        as in the sequential loop even when requests finish out of order.
+        Images fetched past the detected end are removed again.
+        
+        Returns:
+            Number of the last image that belongs to the chapter
+        """
+        pending = {}  # image number -> future, for requests still in flight
+        next_num = start  # Next image number to schedule
+        current_num = start  # Next image number to evaluate in order
+        consecutive_failures = 0
+        
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            while consecutive_failures < max_failures:
+                # Keep the worker pool busy up to the concurrency limit
+                while len(pending) < self.max_concurrency:
+                    url = base_url.replace('XXX', f'{next_num:03d}')
+                    pending[next_num] = executor.submit(self._download_image, url, output_folder,
+                                                     reuse_existing)
+                    next_num += 1
+                
+                future = pending.pop(current_num)
+                try:
+                    image_path = future.result()
+                    logger.debug(f'Downloaded {os.path.basename(image_path)}')
+                    consecutive_failures = 0  # Reset failure counter on success
+                    if on_image is not None:
+                        on_image(image_path)
+                
+                except requests.RequestException as e:
+                    consecutive_failures += 1
+                    if consecutive_failures >= max_failures:
+                        logger.info(f"Reached end of chapter at image {current_num-1:03d} after {max_failures} consecutive failures")
+                    else:
+                        logger.info(f"Failed to download {base_url.replace('XXX', f'{current_num:03d}')}: {e}")
+                current_num += 1
+            
+            # Requests beyond the end of the chapter are not part of it
+            for future in pending.values():
+                future.cancel()
+            wait(pending.values())
+        
+        for future in pending.values():
+            if not future.cancelled() and future.exception() is None:
+                os.remove(future.result())
+        
+        return current_num - consecutive_failures - 1
+    
+    def _passthrough_kind(self, image):
+        """
+        Tell whether an image's compressed data can go into a PDF unchanged.
+        
+        Returns:
+            'jpeg' for RGB or grayscale JPEGs, 'png' for 8-bit RGB or grayscale
+            PNGs without interlacing or transparency, None otherwise
+        """
+        if image.format == 'JPEG' and image.mode in ('RGB', 'L'):
+            return 'jpeg'
+        if image.format == 'PNG' and image.mode in ('RGB', 'L') and not image.info.get('interlace'):
+            return 'png'
+        return None
+    
+    def _insert_png_passthrough(self, pdf_document, page, image_path):
+        """
+        Embed a PNG's IDAT data as a FlateDecode image XObject with PNG predictors.
+        
+        Returns:
+            True if the image was embedded, False if the PNG needs re-encoding
+        """
+        png = read_png_stream(image_path)
+        if (png['bit_depth'] != 8 or png['interlace'] or png['has_transparency']
+                or png['color_type'] not in PNG_COLOR_SPACES):
+            return False
+        
+        color_space, colors = PNG_COLOR_SPACES[png['color_type']]
+        xref = pdf_document.get_new_xref()
+        pdf_document.update_object(xref, "<< /Type /XObject /Subtype /Image >>")
+        pdf_document.update_stream(xref, png['data'], compress=False)
+        for key, value in [
+            ('Width', str(png['width'])),
+            ('Height', str(png['height'])),
+            ('ColorSpace', color_space),
+            ('BitsPerComponent', '8'),
+            ('Filter', '/FlateDecode'),
+            ('DecodeParms', f"<< /Predictor 15 /Colors {colors} /BitsPerComponent 8 /Columns {png['width']} >>"),
+        ]:
+            pdf_document.xref_set_key(xref, key, value)
+        
+        page.insert_image(page.rect, xref=xref)
+        return True
+    
+    def write_pdf(self, image_paths, output_pdf_path, passthrough=None, fast_web_view=False):
+        """
+        Write images into a PDF with one page per image, streaming page by page.
+        
+        Each image is decoded, encoded as `pdf_image_format` (by default JPEG,
+        exactly like PIL's PDF writer does for RGB pages), added to the
+        document and released before the next one is opened, so only one
+        decoded page is in memory at a time (plus the compressed streams of
+        the pages already added). Pages are sized in points like PIL's writer
+        at 72 dpi, one point per pixel.
+        
+        With passthrough, JPEG files are embedded as DCTDecode and suitable
+        PNG files as FlateDecode streams without being decoded at all; only
+        other images are re-encoded.
+        
+        Args:
+            image_paths: Paths of the images, in page order
+            output_pdf_path: Path of the PDF to write
+            passthrough: Whether to embed compressed data as is
+                (default: the processor's pdf_passthrough setting)
+            fast_web_view: Whether to save the PDF with save_web_pdf
+                (default: False)
+        """
+        if passthrough is None:
+            passthrough = self.pdf_passthrough
+        
+        pdf_document = fitz.open()
+        try:
+            for image_path in image_paths:
+                with Image.open(image_path) as img:
+                    width, height = img.size
+                    kind = self._passthrough_kind(img) if passthrough else None
+                
+                page = pdf_document.new_page(width=width, height=height)
+                
+                if kind == 'jpeg':
+                    page.insert_image(page.rect, filename=image_path)
+                    continue
+                if kind == 'png' and self._insert_png_passthrough(pdf_document, page, image_path):
+                    continue
+                
+                with Image.open(image_path) as img:
+                    rgb_image = img.convert('RGB')
+                self.metrics.add('images_decoded')
+                
+                buffer = io.BytesIO()
+                rgb_image.save(buffer, **self.pdf_image_options())
+                page.insert_image(page.rect, stream=buffer.getvalue())
+                rgb_image.close()
+            
+            if fast_web_view:
+                linearized = save_web_pdf(pdf_document, output_pdf_path)
+                logger.debug(f"Saved {output_pdf_path} for fast web view"
+                             f"{'' if linearized else ' without linearization (needs pikepdf)'}")
+            else:
+                pdf_document.save(output_pdf_path, deflate=True)
+        finally:
+            pdf_document.close()
+    
+    def pdf_image_options(self):
+        """
+        PIL save options for PDF page images that are re-encoded.
+        """
+        options = {'format': PDF_IMAGE_FORMATS[self.pdf_image_format]}
+        if self.pdf_image_format == 'jpeg' and self.pdf_image_quality is not None:
+            options['quality'] = self.pdf_image_quality
+        return options
+    
+    def pdf_settings(self):
+        """
+        Settings that change the PDFs written by write_pdf, as recorded in the manifest.
+        """
+        return {'pdf_passthrough': self.pdf_passthrough, 'pdf_image_format': self.pdf_image_format,
+                'pdf_image_quality': self.pdf_image_quality}
     
     def merge_png_to_pdf(self, folder_path, chapter_number):
         """
@@ -99,20 +857,14 @@ class WebtoonProcessor:
         png_files = sorted([f for f in os.listdir(folder_path) if f.endswith('.png')])
         
         if not png_files:
-            print(f"No PNG images found in the directory '{folder_path}'.")
+            logger.warning(f"No PNG images found in the directory '{folder_path}'.")
             return None
 
-        # Open the first image to get the size and mode
-        first_image_path = os.path.join(folder_path, png_files[0])
-        first_image = Image.open(first_image_path)
-        
-        # Create a list to store all image objects
-        image_list = [Image.open(os.path.join(folder_path, f)).convert('RGB') for f in png_files]
-
-        # Save the images as a PDF
-        image_list[0].save(output_pdf_path, save_all=True, append_images=image_list[1:])
+        # Add the images to the PDF one page at a time
+        self.write_pdf([os.path.join(folder_path, f) for f in png_files], output_pdf_path)
         
-        print(f'PDF created successfully at {output_pdf_path}')
+        self._count_written(output_pdf_path)
+        logger.info(f'PDF created successfully at {output_pdf_path}')
         return output_pdf_path
     
     def pdf_to_long_image(self, pdf_path, chapter_number):
@@ -132,6 +884,9 @@ class WebtoonProcessor:
         # Open the PDF file
         pdf_document = fitz.open(pdf_path)
         
+        if self.use_memmap:
+            return self._pdf_to_memmap_long_image(pdf_document, chapter_number, output_image_path)
+        
         # Get the total number of pages
         num_pages = pdf_document.page_count
         
@@ -141,11 +896,13 @@ class WebtoonProcessor:
         # Iterate through each page and convert it to an image
         for i in range(num_pages):
             page = pdf_document.load_page(i)
-            pix = page.get_pixmap()
+            pix = page.get_pixmap(matrix=self._page_matrix(page))
             
             # Convert Pixmap to PIL Image
             img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
             images.append(img)
+            self.metrics.add('images_decoded')
+            self.save_preview(img, chapter_number, i)
         
         # Determine the total height of the final image
         total_height = sum(img.height for img in images)
@@ -162,7 +919,194 @@ class WebtoonProcessor:
         
         # Save the final image
         final_image.save(output_image_path)
-        print(f'Long image created successfully at {output_image_path}')
+        self._count_written(output_image_path)
+        logger.info(f'Long image created successfully at {output_image_path}')
+        return output_image_path
+    
+    def memmap_path(self, chapter_number):
+        """
+        Path of the memory-mapped pixel buffer in the chapter's work folder.
+        """
+        chapter_folder = os.path.join(self.raw_folder, f"Chapter{chapter_number}")
+        os.makedirs(chapter_folder, exist_ok=True)
+        return os.path.join(chapter_folder, f"Chapter{chapter_number}_Strip.npy")
+    
+    def _pdf_to_memmap_long_image(self, pdf_document, chapter_number, output_image_path):
+        """
+        Rasterize the PDF pages straight into the chapter's memmap buffer.
+        """
+        page_sizes = [(page.rect * self._page_matrix(page)).irect for page in pdf_document]
+        max_width = max(size.width for size in page_sizes)
+        total_height = sum(size.height for size in page_sizes)
+        strip = MemmapStrip.create(self.memmap_path(chapter_number), max_width, total_height)
+        
+        y_offset = 0
+        for index, page in enumerate(pdf_document):
+            pix = page.get_pixmap(matrix=self._page_matrix(page))
+            pixels = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)
+            pixels = pixels[:, :pix.width * 3].reshape(pix.height, pix.width, 3)
+            height = min(pix.height, total_height - y_offset)
+            width = min(pix.width, max_width)
+            strip.pixels[y_offset:y_offset + height, :width] = pixels[:height, :width]
+            y_offset += height
+            self.metrics.add('images_decoded')
+            if self.preview_width:
+                self.save_preview(Image.fromarray(pixels, "RGB"), chapter_number, index)
+        
+        return self._save_memmap_long_image(strip, output_image_path)
+    
+    def _images_to_memmap_long_image(self, image_paths, sizes, chapter_number, output_image_path):
+        """
+        Decode the downloaded images straight into the chapter's memmap buffer.
+        """
+        max_width = max(width for width, _ in sizes)
+        total_height = sum(height for _, height in sizes)
+        strip = MemmapStrip.create(self.memmap_path(chapter_number), max_width, total_height)
+        
+        y_offset = 0
+        for index, (image_path, (width, height)) in enumerate(zip(image_paths, sizes)):
+            page = self.decode_page(image_path, chapter_number, index)
+            strip.pixels[y_offset:y_offset + height, :width] = np.asarray(page)
+            y_offset += height
+        
+        return self._save_memmap_long_image(strip, output_image_path)
+    
+    def _save_memmap_long_image(self, strip, output_image_path):
+        """
+        Write the long PNG and its gutter index from a filled memmap buffer.
+        """
+        strip.flush()
+        strip.save_png(output_image_path)
+        black_rows, white_rows = strip.find_uniform_rows()
+        self.save_gutter_index(output_image_path, strip.width, black_rows, white_rows)
+        strip.close()
+        
+        self._count_written(output_image_path)
+        logger.info(f'Long image created successfully at {output_image_path}')
+        return output_image_path
+    
+    def _count_written(self, path):
+        """Add the size of a finished output file to the bytes_written counter."""
+        self.metrics.add('bytes_written', os.path.getsize(path))
+    
+    def _page_matrix(self, page):
+        """
+        Rendering matrix of a PDF page: 72 dpi, or less if the page is wider than `strip_width`.
+        """
+        zoom = 1.0
+        if self.strip_width and page.rect.width > self.strip_width:
+            zoom = self.strip_width / page.rect.width
+        return fitz.Matrix(zoom, zoom)
+    
+    def decode_page(self, image_path, chapter_number=None, page_index=None):
+        """
+        Decode a downloaded page for the long strip, scaled down to
+        `strip_width`, and save its preview if `preview_width` is set.
+        
+        Args:
+            image_path: Path of the page
+            chapter_number: Chapter the preview belongs to (default: no preview)
+            page_index: Position of the page in the chapter, from 0
+        
+        Returns:
+            RGB PIL image
+        """
+        image = decode_page(image_path, self.strip_width)
+        self.metrics.add('images_decoded')
+        if chapter_number is not None:
+            self.save_preview(image, chapter_number, page_index)
+        return image
+    
+    def save_preview(self, image, chapter_number, page_index):
+        """
+        Save a `preview_width` wide JPEG of a decoded page as
+        Previews/ChapterN/page_001.jpg, and for the first page a cover of its
+        top (3:4) as Previews/ChapterN_cover.jpg. Does nothing without `preview_width`.
+        """
+        if not self.preview_width:
+            return
+        folder = os.path.join(self.preview_folder, f"Chapter{chapter_number}")
+        os.makedirs(folder, exist_ok=True)
+        
+        previews = [(image, os.path.join(folder, f"page_{page_index + 1:03d}.jpg"))]
+        if page_index == 0:
+            cover = image.crop((0, 0, image.width, min(image.height, image.width * 4 // 3)))
+            previews.append((cover, os.path.join(self.preview_folder, f"Chapter{chapter_number}_cover.jpg")))
+        
+        for source, path in previews:
+            preview = source.resize(scaled_size(source.size, self.preview_width), Image.LANCZOS, reducing_gap=2.0)
+            preview.save(path, 'JPEG', quality=80)
+            self._count_written(path)
+    
+    def strip_settings(self):
+        """
+        Settings that change the long strip, as recorded in the manifest.
+        """
+        settings = {}
+        if self.strip_width:
+            settings['strip_width'] = self.strip_width
+        if self.preview_width:
+            settings['preview_width'] = self.preview_width
+        return settings
+    
+    def _list_images(self, folder_path):
+        """
+        Paths of all downloaded images in a folder, sorted by their names.
+        """
+        image_files = sorted([f for f in os.listdir(folder_path) if f.lower().endswith(IMAGE_EXTENSIONS)])
+        return [os.path.join(folder_path, f) for f in image_files]
+    
+    def images_to_long_image(self, folder_path, chapter_number):
+        """
+        Task 2+3 (direct): Stack the downloaded images into a long image
+        
+        Produces the same layout as merge_png_to_pdf followed by
+        pdf_to_long_image (pages left-aligned on a black canvas as wide as the
+        widest page), but skips the intermediate PDF, so no page is encoded and
+        rasterized again and the artwork keeps its native resolution. Only one
+        page is decoded at a time next to the long image.
+        
+        Args:
+            folder_path: Path to the folder containing the downloaded images
+            chapter_number: Chapter number for image naming
+        
+        Returns:
+            Path to the generated long PNG image
+        """
+        output_image_name = f"Chapter{chapter_number}_Merged.png"
+        output_image_path = os.path.join(self.long_png_folder, output_image_name)
+        
+        image_paths = self._list_images(folder_path)
+        
+        if not image_paths:
+            logger.warning(f"No images found in the directory '{folder_path}'.")
+            return None
+        
+        # Read only the image headers to lay out the long image
+        sizes = []
+        for image_path in image_paths:
+            with Image.open(image_path) as img:
+                sizes.append(scaled_size(img.size, self.strip_width))
+        
+        if self.use_memmap:
+            return self._images_to_memmap_long_image(image_paths, sizes, chapter_number, output_image_path)
+        
+        total_height = sum(height for _, height in sizes)
+        max_width = max(width for width, _ in sizes)
+        
+        # Create a new blank image with the total height
+        final_image = Image.new("RGB", (max_width, total_height))
+        
+        # Paste each page into the final image, decoding one page at a time
+        y_offset = 0
+        for index, (image_path, (_, height)) in enumerate(zip(image_paths, sizes)):
+            final_image.paste(self.decode_page(image_path, chapter_number, index), (0, y_offset))
+            y_offset += height
+        
+        # Save the final image
+        final_image.save(output_image_path)
+        self._count_written(output_image_path)
+        logger.info(f'Long image created successfully at {output_image_path}')
         return output_image_path
     
     def is_black_or_white_band(self, image, y, band_height=5):
@@ -177,64 +1121,437 @@ class WebtoonProcessor:
         white_diff = ImageChops.difference(band, white_band)
         return not black_diff.getbbox() or not white_diff.getbbox()  # Return True if no difference
     
-    def format_png(self, long_image_path, chapter_number):
+    def find_uniform_rows(self, image, block_rows=4096):
+        """
+        Classify every row of an image as uniformly black or white, in one pass.
+        
+        The image is converted to a NumPy array in blocks of `block_rows` rows,
+        so memory stays bounded on tall strips.
+        
+        Args:
+            image: PIL image to scan
+            block_rows: Number of rows converted to an array at a time
+        
+        Returns:
+            Tuple of boolean arrays (black_rows, white_rows), one entry per row
+        """
+        return ImageStrip(image, block_rows).find_uniform_rows()
+    
+    def gutter_index_path(self, long_image_path):
+        """
+        Path of the gutter index sidecar saved next to a long image.
+        """
+        return os.path.splitext(long_image_path)[0] + '.gutters.json'
+    
+    def load_gutter_rows(self, long_image_path, band_height=5):
+        """
+        Get the gutter rows of a long image from its index, building it if needed.
+        
+        The index (see gutter_index_path) stores the uniformly black and white
+        rows of the image as run-length spans together with the SHA-256 of the
+        image file. As long as the image is unchanged, re-slicing it at another
+        page height needs no pixel scan at all.
+        
+        Args:
+            long_image_path: Path to the long PNG image
+            band_height: Number of rows in a band (default: 5)
+        
+        Returns:
+            Sorted array of the row indices that start a black or white band
+        """
+        index_path = self.gutter_index_path(long_image_path)
+        source_hash = file_sha256(long_image_path)
+        
+        index = None
+        if os.path.exists(index_path):
+            with open(index_path, 'r', encoding='utf-8') as file:
+                index = json.load(file)
+        
+        if index is not None and index.get('source_sha256') == source_hash:
+            black_rows = runs_to_mask(index['black_runs'], index['height'])
+            white_rows = runs_to_mask(index['white_runs'], index['height'])
+        else:
+            with Image.open(long_image_path) as long_image:
+                black_rows, white_rows = self.find_uniform_rows(long_image)
+                width = long_image.width
+            self.save_gutter_index(long_image_path, width, black_rows, white_rows, source_hash)
+        
+        return find_band_starts(black_rows, white_rows, band_height)
+    
+    def save_gutter_index(self, long_image_path, width, black_rows, white_rows, source_hash=None):
+        """
+        Save the gutter index sidecar of a long image (see load_gutter_rows).
+        
+        Args:
+            long_image_path: Path to the long PNG image the index describes
+            width: Width of the long image
+            black_rows: Boolean array, True for uniformly black rows
+            white_rows: Boolean array, True for uniformly white rows
+            source_hash: SHA-256 of the long image file, computed if not given
+        """
+        index_path = self.gutter_index_path(long_image_path)
+        index = {
+            'source_sha256': source_hash or file_sha256(long_image_path),
+            'width': width,
+            'height': len(black_rows),
+            'black_runs': mask_to_runs(black_rows),
+            'white_runs': mask_to_runs(white_rows),
+        }
+        with open(index_path, 'w', encoding='utf-8') as file:
+            json.dump(index, file)
+        logger.info(f'Gutter index saved at {index_path}')
+    
+    def format_png(self, long_image_path, chapter_number, page_height=None, min_height=None,
+                   temporary=False, profiles=None):
         """
         Task 4: Format the long PNG into smaller slices
         
+        Break points come from the gutter index next to the long image (see
+        load_gutter_rows), so slicing the same image again at other page sizes
+        skips the pixel scan.
+        
         Args:
             long_image_path: Path to the long PNG image
             chapter_number: Chapter number for output folder naming
+            page_height: Height a slice has to reach before it may be cut
+                (default: A4 height at 72 dpi)
+            min_height: Minimum slice height (default: page_height)
+            temporary: Whether the slices are deleted once the final PDF is built
+                (see png_save_options) (default: False)
+            profiles: Output profiles to slice the image for in one pass
+                (see format_profiles); page_height and min_height are then ignored
         
         Returns:
-            Path to the folder containing formatted PNG slices
+            Path to the folder containing formatted PNG slices, or with
+            profiles a list of the slice folders of every profile
         """
-        output_folder = os.path.join(self.formatted_png_folder, f"Chapter{chapter_number}")
-        os.makedirs(output_folder, exist_ok=True)
+        # Rows where a black or white band starts, from the gutter index
+        gutter_rows = self.load_gutter_rows(long_image_path)
+
+        # Slice the memmap buffer left by the previous stage instead of decoding the PNG
+        memmap_path = self.memmap_path(chapter_number) if self.use_memmap else None
+        if memmap_path is not None and os.path.exists(memmap_path):
+            strip = MemmapStrip.open(memmap_path)
+            with Image.open(long_image_path) as long_image:
+                matches = long_image.size == (strip.width, strip.height)
+            if matches:
+                try:
+                    return self._slice_strip(strip, chapter_number, page_height, min_height,
+                                             gutter_rows, temporary, profiles)
+                finally:
+                    strip.close()
+            strip.close()
 
         # Load the long image
+        self.metrics.add('images_decoded')
         with Image.open(long_image_path) as long_image:
-            img_width, img_height = long_image.size
-
-            # A4 page dimensions in pixels (at 72 dpi)
-            a4_width, a4_height = int(A4[0]), int(A4[1])
-            min_height = a4_height  # Minimum slice height is A4
-
-            current_height = 0
-            slice_number = 0
-
-            while current_height < img_height:
-                # Start with the maximum possible slice height
-                slice_height = img_height - current_height
-                
-                # Find the next black band if the height exceeds A4
-                if slice_height > a4_height:
-                    for y in range(a4_height, slice_height):
-                        if self.is_black_or_white_band(long_image, current_height + y):
-                            slice_height = y
-                            break
+            return self._slice_strip(ImageStrip(long_image), chapter_number,
+                                     page_height, min_height, gutter_rows, temporary, profiles)
+    
+    def _slice_strip(self, strip, chapter_number, page_height, min_height, gutter_rows, temporary,
+                     profiles=None):
+        """
+        Slice a strip with format_strip, or with format_profiles if profiles are given.
+        """
+        if profiles:
+            return self.format_profiles(strip, chapter_number, profiles, gutter_rows, temporary)
+        return self.format_strip(strip, chapter_number, page_height, min_height, gutter_rows, temporary)
+    
+    def format_strip(self, strip, chapter_number, page_height=None, min_height=None, gutter_rows=None,
+                     temporary=False):
+        """
+        Task 4 on any strip: cut it into slices at black or white bands
+        
+        Slices are cropped in order on the calling thread and encoded on a
+        pool of `encode_workers` threads (see save_slices).
+        
+        Args:
+            strip: ImageStrip over a long image, or VirtualStrip over the source pages
+            chapter_number: Chapter number for output folder naming
+            page_height: Height a slice has to reach before it may be cut
+                (default: A4 height at 72 dpi)
+            min_height: Minimum slice height (default: page_height)
+            gutter_rows: Rows where a band starts; scanned from the strip if not given
+            temporary: Whether the slices are deleted once the final PDF is built
+                (see png_save_options) (default: False)
+        
+        Returns:
+            Path to the folder containing formatted PNG slices
+        """
+        output_folder = self._prepare_slice_folder(chapter_number)
 
-                # Ensure slice height is not less than the minimum height
-                slice_height = max(slice_height, min_height)
+        # A4 page height in pixels (at 72 dpi) unless a page height is given
+        if page_height is None:
+            page_height = int(A4[1])
+        if min_height is None:
+            min_height = page_height  # Minimum slice height is one page
 
-                # Extract the slice from the long image
-                with long_image.crop((0, current_height, img_width, current_height + slice_height)) as slice_image:
-                    slice_image_path = os.path.join(output_folder, f'slice_{slice_number:03d}.png')
-                    slice_image.save(slice_image_path)
+        if gutter_rows is None:
+            gutter_rows = find_band_starts(*strip.find_uniform_rows())
 
-                print(f'Saved {slice_image_path}')
+        slices = plan_slices(gutter_rows, strip.height, page_height, min_height)
 
-                current_height += slice_height
-                slice_number += 1
+        # Strips are not thread-safe, so slices are extracted here and only encoded in parallel
+        slice_images = ((slice_number, strip.crop(top, top + slice_height))
+                        for slice_number, (top, slice_height) in enumerate(slices))
+        self.save_slices(slice_images, output_folder, temporary)
 
-        print(f'Slicing completed. Total slices: {slice_number}')
+        logger.info(f'Slicing completed. Total slices: {len(slices)}')
+        return output_folder
+    
+    def for_profile(self, profile):
+        """
+        Processor that writes slices and PDFs with the settings of an output
+        profile and shares everything else (HTTP client, folders, metrics) with this one.
+        """
+        processor = copy.copy(self)
+        for key in PROFILE_SETTINGS:
+            if key in profile:
+                setattr(processor, key, profile[key])
+        return processor
+    
+    def format_profiles(self, strip, chapter_number, profiles, gutter_rows=None, temporary=False):
+        """
+        Task 4 for several output profiles in one pass over the strip
+        
+        Gutters are found once, and every profile plans its own slices; its
+        page height is given in output pixels, so it is scaled back to strip
+        rows for a profile with another width. The strip is then cropped once,
+        top to bottom, and each slice is handed to the encoder pool of its
+        profile, which resizes and encodes it in that profile's format. A
+        VirtualStrip keeps as many pages decoded as the tallest slice spans,
+        so every page is decoded once for all profiles.
+        
+        Args:
+            strip: ImageStrip, MemmapStrip or VirtualStrip
+            chapter_number: Chapter number for output folder naming
+            profiles: Output profiles (see check_profiles); the slices of each
+                go to FormattedPNGs/ChapterN_<name>
+            gutter_rows: Rows where a band starts; scanned from the strip if not given
+            temporary: Whether the slices are deleted once the final PDFs are built
+                (default: False)
+        
+        Returns:
+            List of the slice folders of the profiles, in profile order
+        """
+        check_profiles(profiles)
+        if gutter_rows is None:
+            gutter_rows = find_band_starts(*strip.find_uniform_rows())
+        
+        # (top, profile index, slice number, height) of every slice of every profile
+        crops = []
+        scales = []
+        for index, profile in enumerate(profiles):
+            scale = profile['width'] / strip.width if profile.get('width') else 1.0
+            page_height = profile.get('page_height') or int(A4[1])
+            min_height = profile.get('min_height') or page_height
+            slices = plan_slices(gutter_rows, strip.height, max(1, round(page_height / scale)),
+                                 max(1, round(min_height / scale)))
+            crops.extend((top, index, slice_number, slice_height)
+                         for slice_number, (top, slice_height) in enumerate(slices))
+            scales.append(scale)
+            logger.info(f"Profile {profile['name']}: {len(slices)} slices")
+        crops.sort()
+        
+        if isinstance(strip, VirtualStrip) and crops:
+            spans = (strip.locate(min(top + slice_height, strip.height) - 1)[0] - strip.locate(top)[0] + 1
+                     for top, _, _, slice_height in crops)
+            strip.cached_pages = max(strip.cached_pages, max(spans) + 1)
+        
+        folders = [self._prepare_slice_folder(profile_chapter(chapter_number, profile)) for profile in profiles]
+        queues = [queue.Queue(maxsize=2 * self.encode_workers) for _ in profiles]
+        stop = threading.Event()
+        
+        def slice_images(index):
+            while True:
+                item = _get_unless_stopped(queues[index], stop)
+                if item is None:
+                    return
+                yield item
+        
+        # One writer thread per profile, each with its own encoder pool; strips are
+        # not thread-safe, so all crops are made here
+        with ThreadPoolExecutor(max_workers=len(profiles)) as executor:
+            writers = [executor.submit(self.for_profile(profile).save_slices, slice_images(index),
+                                       folders[index], temporary, scales[index])
+                       for index, profile in enumerate(profiles)]
+            for writer in writers:
+                writer.add_done_callback(lambda future: future.exception() is not None and stop.set())
+            try:
+                for top, index, slice_number, slice_height in crops:
+                    _put_unless_stopped(queues[index], (slice_number, strip.crop(top, top + slice_height)), stop)
+                for slice_queue in queues:
+                    _put_unless_stopped(slice_queue, None, stop)
+            except PipelineAborted:
+                pass  # A writer failed; its error is raised below
+            except BaseException:
+                stop.set()
+                raise
+        
+        errors = [writer.exception() for writer in writers]
+        for error in errors:
+            if error is not None and not isinstance(error, PipelineAborted):
+                raise error
+        
+        logger.info(f'Slicing completed for {len(profiles)} profiles. Total slices: {len(crops)}')
+        return folders
+    
+    def png_save_options(self, temporary=False):
+        """
+        PIL save options for PNG slices.
+        
+        Slices that cleanup deletes anyway are written at zlib level 1 with
+        `fast_intermediates`, unless `pdf_passthrough` embeds their data in
+        the final PDF as is.
+        
+        Args:
+            temporary: Whether the slices are deleted once the final PDF is built
+        
+        Returns:
+            Dictionary of keyword arguments for Image.save
+        """
+        if temporary and self.fast_intermediates and not self.pdf_passthrough:
+            return {'compress_level': 1}
+        return {'compress_level': self.png_compress_level, 'optimize': self.png_optimize}
+    
+    def slice_save_options(self):
+        """
+        PIL save options for slices in a lossy `slice_format`.
+        """
+        return {} if self.slice_quality is None else {'quality': self.slice_quality}
+    
+    def slice_settings(self, temporary=False):
+        """
+        Settings that change the slices, as recorded in the manifest.
+        """
+        if self.slice_format == 'png':
+            return {'format': 'png', **self.png_save_options(temporary)}
+        return {'format': self.slice_format, **self.slice_save_options()}
+    
+    def _prepare_slice_folder(self, chapter_number):
+        """
+        Create the slice folder of a chapter and remove slices of an earlier run,
+        which could be more or in another format.
+        
+        Returns:
+            Path to the folder
+        """
+        output_folder = os.path.join(self.formatted_png_folder, f"Chapter{chapter_number}")
+        os.makedirs(output_folder, exist_ok=True)
+        for file_name in os.listdir(output_folder):
+            if file_name.startswith('slice_'):
+                os.remove(os.path.join(output_folder, file_name))
         return output_folder
     
+    def save_slices(self, slice_images, output_folder, temporary=False, scale=1.0):
+        """
+        Encode slices as `slice_format` on a pool of `encode_workers` threads.
+        
+        Files are named by slice number, and progress is reported in slice
+        order. A slice too large for the format is written as PNG instead.
+        At most twice as many slices as workers are waiting to be encoded, so
+        a slow encoder holds back the producer.
+        
+        Args:
+            slice_images: Iterable of (slice number, PIL image), in order
+            output_folder: Folder the slices are written to
+            temporary: Whether the slices are deleted once the final PDF is built
+            scale: Factor the slices are resized by while encoding (default: 1.0)
+        
+        Returns:
+            Number of slices saved
+        """
+        image_format, extension, max_dimension = SLICE_FORMATS[self.slice_format]
+        options = self.png_save_options(temporary) if image_format == 'PNG' else self.slice_save_options()
+        png_options = self.png_save_options(temporary)
+        pending = deque()  # (path, future) in slice order
+        saved = 0
+        
+        with ThreadPoolExecutor(max_workers=self.encode_workers) as executor:
+            for slice_number, slice_image in slice_images:
+                size = None
+                if scale != 1.0:
+                    size = (max(1, round(slice_image.width * scale)), max(1, round(slice_image.height * scale)))
+                if max_dimension is not None and max(size or slice_image.size) > max_dimension:
+                    encoding = ('PNG', '.png', png_options)
+                else:
+                    encoding = (image_format, extension, options)
+                slice_image_path = os.path.join(output_folder, f'slice_{slice_number:03d}{encoding[1]}')
+                pending.append((slice_image_path, executor.submit(_save_image, slice_image, slice_image_path,
+                                                                  encoding[0], encoding[2], size)))
+                
+                while pending and (pending[0][1].done() or len(pending) > 2 * self.encode_workers):
+                    slice_image_path, future = pending.popleft()
+                    future.result()
+                    logger.debug(f'Saved {slice_image_path}')
+                    self.metrics.add('slices_emitted')
+                    self._count_written(slice_image_path)
+                    saved += 1
+            
+            while pending:
+                slice_image_path, future = pending.popleft()
+                future.result()
+                logger.debug(f'Saved {slice_image_path}')
+                self.metrics.add('slices_emitted')
+                self._count_written(slice_image_path)
+                saved += 1
+        
+        return saved
+    
+    def format_images(self, folder_path, chapter_number, page_height=None, min_height=None,
+                      save_long_png=True, temporary=False, profiles=None):
+        """
+        Task 2+3+4 (virtual strip): Slice the downloaded images without building the long image
+        
+        The pages are treated as one VirtualStrip, so gutters are found and
+        slices spanning page boundaries are cropped while only a few pages are
+        decoded at a time. The long PNG, if wanted, is streamed to disk page by
+        page, together with its gutter index.
+        
+        Args:
+            folder_path: Path to the folder containing the downloaded images
+            chapter_number: Chapter number for naming
+            page_height: Height a slice has to reach before it may be cut
+                (default: A4 height at 72 dpi)
+            min_height: Minimum slice height (default: page_height)
+            save_long_png: Whether to write LongPNGs/ChapterN_Merged.png (default: True)
+            temporary: Whether the slices are deleted once the final PDF is built
+                (see png_save_options) (default: False)
+            profiles: Output profiles to slice the pages for in one pass
+                (see format_profiles); page_height and min_height are then ignored
+        
+        Returns:
+            Path to the folder containing formatted PNG slices, or with
+            profiles a list of the slice folders of every profile
+        """
+        image_paths = self._list_images(folder_path)
+        if not image_paths:
+            logger.warning(f"No images found in the directory '{folder_path}'.")
+            return None
+        
+        strip = VirtualStrip(image_paths, max_width=self.strip_width,
+                             on_decode=lambda index, page: self.save_preview(page, chapter_number, index))
+        black_rows, white_rows = strip.find_uniform_rows()
+        
+        if save_long_png:
+            long_image_path = os.path.join(self.long_png_folder, f"Chapter{chapter_number}_Merged.png")
+            strip.save_png(long_image_path)
+            self._count_written(long_image_path)
+            logger.info(f'Long image created successfully at {long_image_path}')
+            self.save_gutter_index(long_image_path, strip.width, black_rows, white_rows)
+        
+        try:
+            return self._slice_strip(strip, chapter_number, page_height, min_height,
+                                     find_band_starts(black_rows, white_rows), temporary, profiles)
+        finally:
+            self.metrics.add('images_decoded', strip.decoded_pages)
+    
     def formatted_pngs_to_pdf(self, formatted_folder, chapter_number):
         """
-        Task 5: Convert the formatted PNGs back to a PDF file
+        Task 5: Convert the formatted slices back to a PDF file
         
         Args:
-            formatted_folder: Path to the folder containing formatted PNG slices
+            formatted_folder: Path to the folder containing the formatted slices
             chapter_number: Chapter number for PDF naming
         
         Returns:
@@ -243,23 +1560,21 @@ class WebtoonProcessor:
         output_pdf_name = f"Chapter{chapter_number}_Final.pdf"
         output_pdf_path = os.path.join(self.final_pdf_folder, output_pdf_name)
         
-        # List all PNG files in the folder and sort them by their names
-        png_files = sorted([f for f in os.listdir(formatted_folder) if f.endswith('.png')])
+        # List all slices in the folder sorted by their names
+        slice_paths = self._list_images(formatted_folder)
         
-        if not png_files:
-            print(f"No PNG images found in the directory '{formatted_folder}'.")
+        if not slice_paths:
+            logger.warning(f"No slices found in the directory '{formatted_folder}'.")
             return None
 
-        # Create a list to store all image objects
-        image_list = [Image.open(os.path.join(formatted_folder, f)).convert('RGB') for f in png_files]
-
-        # Save the images as a PDF
-        image_list[0].save(output_pdf_path, save_all=True, append_images=image_list[1:])
+        # Add the images to the PDF one page at a time
+        self.write_pdf(slice_paths, output_pdf_path, fast_web_view=self.pdf_fast_web_view)
         
-        print(f'Final PDF created successfully at {output_pdf_path}')
+        self._count_written(output_pdf_path)
+        logger.info(f'Final PDF created successfully at {output_pdf_path}')
         return output_pdf_path
     
-    def cleanup_temp_files(self, chapter_number, keep_raw=False):
+    def cleanup_temp_files(self, chapter_number, keep_raw=False, profiles=None):
         """
         Delete temporary files while keeping only the essential outputs:
         1. Long PNG image
@@ -268,8 +1583,9 @@ class WebtoonProcessor:
         Args:
             chapter_number: Chapter number to clean up
             keep_raw: If True, keeps the raw downloaded images (default: False)
+            profiles: Output profiles whose slice folders are deleted as well
         """
-        print(f"Cleaning up temporary files for Chapter {chapter_number}...")
+        logger.info(f"Cleaning up temporary files for Chapter {chapter_number}...")
         
         # Paths to check and potentially delete
         raw_folder = os.path.join(self.raw_folder, f"Chapter{chapter_number}")
@@ -278,65 +1594,522 @@ class WebtoonProcessor:
         
         # Delete the raw images folder if it exists and keep_raw is False
         if not keep_raw and os.path.exists(raw_folder):
-            print(f"Deleting raw images folder: {raw_folder}")
+            logger.info(f"Deleting raw images folder: {raw_folder}")
             shutil.rmtree(raw_folder)
         
+        # The memmap pixel buffer is never kept, even with the raw images
+        memmap_path = os.path.join(raw_folder, f"Chapter{chapter_number}_Strip.npy")
+        if os.path.exists(memmap_path):
+            logger.info(f"Deleting memmap pixel buffer: {memmap_path}")
+            os.remove(memmap_path)
+        
         # Delete the temporary merged PDF if it exists
         if os.path.exists(temp_pdf_path):
-            print(f"Deleting temporary merged PDF: {temp_pdf_path}")
+            logger.info(f"Deleting temporary merged PDF: {temp_pdf_path}")
             os.remove(temp_pdf_path)
         
-        # Delete the formatted PNG slices folder if it exists
-        if os.path.exists(formatted_folder):
-            print(f"Deleting formatted PNG slices folder: {formatted_folder}")
-            shutil.rmtree(formatted_folder)
+        # Delete the formatted PNG slices folders if they exist
+        profile_folders = [os.path.join(self.formatted_png_folder, f"Chapter{profile_chapter(chapter_number, profile)}")
+                           for profile in profiles or []]
+        for folder in [formatted_folder] + profile_folders:
+            if os.path.exists(folder):
+                logger.info(f"Deleting formatted PNG slices folder: {folder}")
+                shutil.rmtree(folder)
+            
+        logger.info("Cleanup completed!")
+        logger.info("Remaining files:")
+        logger.info(f"  - Long PNG: {os.path.join(self.long_png_folder, f'Chapter{chapter_number}_Merged.png')}")
+        logger.info(f"  - Gutter index: {os.path.join(self.long_png_folder, f'Chapter{chapter_number}_Merged.gutters.json')}")
+        if profiles:
+            for profile in profiles:
+                final_pdf_name = f"Chapter{profile_chapter(chapter_number, profile)}_Final.pdf"
+                logger.info(f"  - Final PDF ({profile['name']}): {os.path.join(self.final_pdf_folder, final_pdf_name)}")
+        else:
+            logger.info(f"  - Final PDF: {os.path.join(self.final_pdf_folder, f'Chapter{chapter_number}_Final.pdf')}")
+        if self.resume:
+            logger.info(f"  - Manifest: {self.manifest_path(chapter_number)}")
+    
+    def run_pipeline(self, base_url, chapter_number, start_num="001", page_height=None,
+                     min_height=None, save_long_png=True, queue_size=4, reuse_existing=False,
+                     temporary=False):
+        """
+        Task 1+2+3+4 (pipelined): Download, decode and slice a chapter concurrently
+        
+        Instead of running every stage to completion before the next starts,
+        pages flow through bounded queues: a download thread hands over each
+        image as soon as it is on disk (in image order), the calling thread
+        decodes it, appends it to the long PNG and feeds a StreamingSlicer that
+        cuts slices as soon as enough rows are known, and a writer thread
+        hands the slices to the encoder pool (see save_slices). Chapter
+        latency approaches the slower of download and compute instead of
+        their sum. The queues hold at most `queue_size` pages or slices, so a
+        slow stage holds back the ones before it and memory stays bounded.
+        
+        Args:
+            base_url: URL template with 'XXX' as placeholder for image number
+            chapter_number: Chapter number for naming
+            start_num: Starting image number (string), defaults to "001"
+            page_height: Height a slice has to reach before it may be cut
+                (default: A4 height at 72 dpi)
+            min_height: Minimum slice height (default: page_height)
+            save_long_png: Whether to write LongPNGs/ChapterN_Merged.png (default: True)
+            queue_size: Capacity of the page and slice queues (default: 4)
+            reuse_existing: Whether images already in the chapter folder are kept
+                instead of being fetched again (default: False)
+            temporary: Whether the slices are deleted once the final PDF is built
+                (see png_save_options) (default: False)
+        
+        Returns:
+            Path to the folder containing formatted PNG slices, or None if no
+            images were downloaded
+        """
+        output_folder = self._prepare_slice_folder(chapter_number)
+        long_image_path = os.path.join(self.long_png_folder, f"Chapter{chapter_number}_Merged.png")
+        
+        if page_height is None:
+            page_height = int(A4[1])
+        if min_height is None:
+            min_height = page_height
+        
+        pages = queue.Queue(maxsize=queue_size)  # Paths of downloaded images, None at the end
+        slices = queue.Queue(maxsize=queue_size)  # (slice number, pixels), None at the end
+        stop = threading.Event()
+        errors = []
+        
+        def download_stage():
+            try:
+                self.download_images(base_url, chapter_number, start_num,
+                                     on_image=lambda image_path: _put_unless_stopped(pages, image_path, stop),
+                                     reuse_existing=reuse_existing)
+            except PipelineAborted:
+                pass
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+            finally:
+                try:
+                    _put_unless_stopped(pages, None, stop)
+                except PipelineAborted:
+                    pass
+        
+        def received_slices():
+            while True:
+                item = _get_unless_stopped(slices, stop)
+                if item is None:
+                    return
+                slice_number, pixels = item
+                yield slice_number, Image.fromarray(pixels, "RGB")
+        
+        def write_stage():
+            try:
+                self.save_slices(received_slices(), output_folder, temporary)
+            except PipelineAborted:
+                pass
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+        
+        threads = [threading.Thread(target=download_stage, name=f"download-{chapter_number}", daemon=True),
+                   threading.Thread(target=write_stage, name=f"write-{chapter_number}", daemon=True)]
+        for thread in threads:
+            thread.start()
+        
+        slicer = StreamingSlicer(page_height, min_height,
+                                 on_slice=lambda number, pixels: _put_unless_stopped(slices, (number, pixels), stop))
+        image_paths = []
+        long_writer = None
+        try:
+            while True:
+                image_path = _get_unless_stopped(pages, stop)
+                if image_path is None:
+                    break
+                image_paths.append(image_path)
+                
+                pixels = np.asarray(self.decode_page(image_path, chapter_number, len(image_paths) - 1))
+                
+                if save_long_png:
+                    if long_writer is None and len(image_paths) == 1:
+                        long_writer = PngRowWriter(long_image_path, pixels.shape[1])
+                    if long_writer is not None and pixels.shape[1] > long_writer.width:
+                        # A wider page changes the strip width, so write the long PNG at the end instead
+                        long_writer.abort()
+                        long_writer = None
+                    if long_writer is not None:
+                        padded = pixels
+                        if pixels.shape[1] < long_writer.width:
+                            padded = np.zeros((pixels.shape[0], long_writer.width, 3), dtype=np.uint8)
+                            padded[:, :pixels.shape[1]] = pixels
+                        long_writer.write(padded)
+                
+                slicer.add_page(pixels)
             
-        print("Cleanup completed!")
-        print("Remaining files:")
-        print(f"  - Long PNG: {os.path.join(self.long_png_folder, f'Chapter{chapter_number}_Merged.png')}")
-        print(f"  - Final PDF: {os.path.join(self.final_pdf_folder, f'Chapter{chapter_number}_Final.pdf')}")
+            slice_count = slicer.finish()
+            _put_unless_stopped(slices, None, stop)
+        except BaseException as e:
+            if not isinstance(e, PipelineAborted):
+                errors.append(e)
+            stop.set()
+            if long_writer is not None:
+                long_writer.abort()
+                long_writer = None
+        finally:
+            for thread in threads:
+                thread.join()
+        
+        if errors:
+            raise errors[0]
+        
+        if not image_paths:
+            logger.warning(f"No images found for Chapter {chapter_number}.")
+            return None
+        
+        if save_long_png:
+            if long_writer is not None:
+                long_writer.close()
+                black_rows, white_rows, width = slicer.black_rows, slicer.white_rows, long_writer.width
+            else:
+                strip = VirtualStrip(image_paths, max_width=self.strip_width)
+                strip.save_png(long_image_path)
+                (black_rows, white_rows), width = strip.find_uniform_rows(), strip.width
+                self.metrics.add('images_decoded', strip.decoded_pages)
+            self._count_written(long_image_path)
+            logger.info(f'Long image created successfully at {long_image_path}')
+            self.save_gutter_index(long_image_path, width, black_rows, white_rows)
+        
+        logger.info(f'Slicing completed. Total slices: {slice_count}')
+        return output_folder
     
-    def process_chapter(self, base_url, chapter_number, start_num="001", cleanup=True):
+    def process_chapter(self, base_url, chapter_number, start_num="001", cleanup=True,
+                        direct_strip=False, page_height=None, min_height=None,
+                        virtual_strip=False, save_long_png=True, pipelined=False, from_stage=None,
+                        profiles=None):
         """
         Process a complete chapter through all steps:
         1. Download images
-        2. Merge to PDF
-        3. Convert to long PNG
+        2. Merge to PDF (skipped with direct_strip or virtual_strip)
+        3. Convert to long PNG (streamed, optional with virtual_strip)
         4. Format into slices
         5. Convert back to final PDF
         6. Clean up temporary files (optional)
         
+        With `resume`, every completed step is recorded in Manifests/ChapterN.json
+        and skipped on the next run if its settings and input files are unchanged
+        and its outputs are still on disk. Images that are already downloaded are
+        not fetched again, and a chapter whose final PDF is complete is skipped.
+        
         Args:
             base_url: URL template with 'XXX' as placeholder for image number
             chapter_number: Chapter number
             start_num: Starting image number (string), defaults to "001"
             cleanup: Whether to delete temporary files after processing (default: True)
+            direct_strip: Whether to build the long PNG straight from the downloaded
+                images instead of going through the merged PDF (default: False)
+            page_height: Height a slice has to reach before it may be cut (default: A4)
+            min_height: Minimum slice height (default: page_height)
+            virtual_strip: Whether to slice the downloaded images as a virtual strip,
+                never holding the whole long image in memory (default: False)
+            save_long_png: Whether to write the long PNG with virtual_strip or
+                pipelined (default: True)
+            pipelined: Whether to overlap downloading, decoding and slicing
+                (see run_pipeline) instead of running them one after another (default: False)
+            from_stage: With `resume`, name of the first stage that runs again even
+                if it is recorded as complete, one of manifest.STAGES (default: None)
+            profiles: Output profiles, e.g. for phone, tablet and A4 (see
+                check_profiles). The strip is decoded and scanned once and
+                sliced for every profile in the same pass, and each profile
+                gets its own final PDF, FinalPDFs/ChapterN_<name>_Final.pdf.
+                page_height and min_height are then ignored, and pipelined
+                falls back to virtual_strip (default: None, a single output)
             
         Returns:
-            Path to the final PDF
+            Path to the final PDF, with profiles a list of the final PDFs in
+            profile order, or None if no images were downloaded
+        """
+        # Stage timings and counters of this chapter, written to metrics_folder at the end
+        series = os.path.basename(os.path.normpath(self.base_folder))
+        self.metrics = ChapterMetrics(chapter_number, series, self.profile_folder)
+        try:
+            final_pdf_path = self._process_chapter(base_url, chapter_number, start_num, cleanup,
+                                                   direct_strip, page_height, min_height, virtual_strip,
+                                                   save_long_png, pipelined, from_stage, profiles)
+        except BaseException:
+            self.metrics.status = 'failed'
+            raise
+        else:
+            self.metrics.status = self.metrics.status or ('ok' if final_pdf_path is not None else 'empty')
+        finally:
+            if self.metrics_folder:
+                self.metrics.write(self.metrics_folder, self.metrics_format)
+        return final_pdf_path
+    
+    def _process_chapter(self, base_url, chapter_number, start_num, cleanup, direct_strip, page_height,
+                         min_height, virtual_strip, save_long_png, pipelined, from_stage, profiles):
         """
-        print(f"Starting to process Chapter {chapter_number}...")
+        Body of process_chapter, run while the chapter's metrics are recorded.
+        """
+        if profiles:
+            check_profiles(profiles)
+            if pipelined:
+                # The streaming slicer cuts for one page height only
+                logger.warning("Output profiles are sliced from a virtual strip instead of pipelined")
+                pipelined, virtual_strip = False, True
+            if self.strip_width is None and all(profile.get('width') for profile in profiles):
+                # No profile needs pixels beyond the widest one, so never decode them
+                processor = copy.copy(self)
+                processor.strip_width = max(profile['width'] for profile in profiles)
+                return processor._process_chapter(base_url, chapter_number, start_num, cleanup, direct_strip,
+                                                  page_height, min_height, virtual_strip, save_long_png,
+                                                  pipelined, from_stage, profiles)
+        
+        logger.info(f"Starting to process Chapter {chapter_number}...")
+        
+        manifest = None
+        if self.resume:
+            scratch_folder = self.scratch_folder if self.scratch_folder != self.base_folder else None
+            manifest = ChapterManifest(self.manifest_path(chapter_number), self.base_folder, scratch_folder)
+            if from_stage is not None:
+                manifest.invalidate_from(from_stage)
+        
+        # Settings that change the outputs of each stage
+        download_params = {'base_url': base_url, 'start_num': start_num}
+        # Images on disk are only reused if they were downloaded with the same settings
+        reuse_existing = manifest is not None and manifest.is_current('download', download_params, {},
+                                                                      verify_outputs=False)
+        if profiles:
+            format_params = {'profiles': [{**profile, 'slices': self.for_profile(profile).slice_settings(cleanup)}
+                                          for profile in profiles]}
+        else:
+            format_params = {'page_height': page_height, 'min_height': min_height,
+                             'slices': self.slice_settings(temporary=cleanup)}
+        pdf_params = self.pdf_settings()
+        strip_params = self.strip_settings()
+        if pipelined or virtual_strip:
+            # The strip is built inside the format stage
+            format_params.update(strip_params)
+            chain = [('download', download_params), ('format', format_params)]
+        elif direct_strip:
+            chain = [('download', download_params), ('long_png', strip_params), ('format', format_params)]
+        else:
+            chain = [('download', download_params), ('merge_pdf', pdf_params), ('long_png', strip_params),
+                     ('format', format_params)]
+        chain.append(('final_pdf', self.final_pdf_settings(profiles)))
+        
+        if manifest is not None:
+            # Stages up to the last one with outputs on disk are not run again,
+            # even if the files of the stages before it were cleaned up
+            manifest.reusable = set(manifest.reusable_stages(chain))
+        
+        if manifest is not None and len(manifest.reusable) == len(chain):
+            final_pdf_path = manifest.result('final_pdf')
+            logger.info(f"Chapter {chapter_number} is already complete: {final_pdf_path}")
+            self.metrics.status = 'skipped'
+            if cleanup:
+                with self.metrics.stage('cleanup'):
+                    self.cleanup_temp_files(chapter_number, profiles=profiles)
+            return final_pdf_path
+        
+        if pipelined:
+            # Task 1+2+3+4: Download, decode and slice concurrently
+            def pipeline():
+                formatted_folder = self.run_pipeline(base_url, chapter_number, start_num, page_height,
+                                                     min_height, save_long_png,
+                                                     reuse_existing=reuse_existing, temporary=cleanup)
+                if formatted_folder is not None and manifest is not None:
+                    download_folder = os.path.join(self.raw_folder, f"Chapter{chapter_number}")
+                    manifest.record('download', download_params, {}, download_folder,
+                                    self._list_images(download_folder))
+                return formatted_folder
+            
+            formatted_folder = self._run_stage(manifest, 'format', format_params, 'download',
+                                               pipeline, self._list_images)
+            if formatted_folder is None:
+                logger.warning(f"No images were downloaded for Chapter {chapter_number}, nothing to process.")
+                return None
+            return self._finish_chapter(formatted_folder, chapter_number, cleanup, manifest)
+        
+        # Slice folders: one path, or one per profile
+        list_slices = self._list_images
+        if profiles:
+            list_slices = (lambda folders: [path for folder in folders for path in self._list_images(folder)])
         
         # Task 1: Download images
-        download_folder = self.download_images(base_url, chapter_number, start_num)
+        download_folder = self._run_stage(
+            manifest, 'download', download_params, None,
+            lambda: self.download_images(base_url, chapter_number, start_num,
+                                         reuse_existing=reuse_existing),
+            self._list_images)
+        downloaded_before = manifest is not None and 'download' in manifest.reusable
+        if not downloaded_before and not self._list_images(download_folder):
+            logger.warning(f"No images were downloaded for Chapter {chapter_number}, nothing to process.")
+            return None
         
-        # Task 2: Merge PNGs to PDF
-        merged_pdf_path = self.merge_png_to_pdf(download_folder, chapter_number)
+        if virtual_strip:
+            # Task 2+3+4: Slice the downloaded images as one virtual strip
+            formatted_folder = self._run_stage(
+                manifest, 'format', format_params, 'download',
+                lambda: self.format_images(download_folder, chapter_number, page_height,
+                                           min_height, save_long_png, temporary=cleanup,
+                                           profiles=profiles),
+                list_slices)
+        else:
+            if direct_strip:
+                # Task 2+3: Stack the downloaded images into a long PNG
+                long_png_path = self._run_stage(
+                    manifest, 'long_png', strip_params, 'download',
+                    lambda: self.images_to_long_image(download_folder, chapter_number))
+            else:
+                # Task 2: Merge PNGs to PDF
+                merged_pdf_path = self._run_stage(
+                    manifest, 'merge_pdf', pdf_params, 'download',
+                    lambda: self.merge_png_to_pdf(download_folder, chapter_number))
+                
+                # Task 3: Convert PDF to long PNG
+                long_png_path = self._run_stage(
+                    manifest, 'long_png', strip_params, 'merge_pdf',
+                    lambda: self.pdf_to_long_image(merged_pdf_path, chapter_number))
+            
+            # Task 4: Format the PNG
+            formatted_folder = self._run_stage(
+                manifest, 'format', format_params, 'long_png',
+                lambda: self.format_png(long_png_path, chapter_number, page_height, min_height,
+                                        temporary=cleanup, profiles=profiles),
+                list_slices)
         
-        # Task 3: Convert PDF to long PNG
-        long_png_path = self.pdf_to_long_image(merged_pdf_path, chapter_number)
+        return self._finish_chapter(formatted_folder, chapter_number, cleanup, manifest, profiles)
+    
+    def summary_path(self, chapter_number):
+        """
+        Path of the summary of formats and sizes written next to the final PDF.
+        """
+        return os.path.join(self.final_pdf_folder, f"Chapter{chapter_number}_Final.summary.json")
+    
+    def save_summary(self, chapter_number, formatted_folder, final_pdf_path):
+        """
+        Record the formats, qualities and resulting sizes of a chapter's outputs,
+        so the quality and size trade-off of the settings can be compared.
         
-        # Task 4: Format the PNG
-        formatted_folder = self.format_png(long_png_path, chapter_number)
+        Returns:
+            Summary dictionary, also written to summary_path()
+        """
+        slice_paths = self._list_images(formatted_folder)
+        long_image_path = os.path.join(self.long_png_folder, f"Chapter{chapter_number}_Merged.png")
+        summary = {
+            'chapter': chapter_number,
+            'slices': {
+                'format': self.slice_format,
+                'quality': self.slice_quality,
+                'png_compress_level': self.png_compress_level,
+                'count': len(slice_paths),
+                'bytes': sum(os.path.getsize(path) for path in slice_paths),
+            },
+            'final_pdf': {
+                'path': final_pdf_path,
+                'bytes': os.path.getsize(final_pdf_path),
+                **self.final_pdf_settings(),
+            },
+        }
+        if os.path.exists(long_image_path):
+            summary['long_image'] = {'path': long_image_path, 'bytes': os.path.getsize(long_image_path)}
+        
+        with open(self.summary_path(chapter_number), 'w', encoding='utf-8') as file:
+            json.dump(summary, file, indent=1)
+        
+        slice_desc = self.slice_format if self.slice_quality is None else f"{self.slice_format} q{self.slice_quality}"
+        logger.info(f"Size summary: {len(slice_paths)} slices ({slice_desc}) "
+                    f"{summary['slices']['bytes'] / 1024 ** 2:.1f} MiB, "
+                    f"final PDF {summary['final_pdf']['bytes'] / 1024 ** 2:.1f} MiB")
+        return summary
+    
+    def manifest_path(self, chapter_number):
+        """
+        Path of the manifest recording the completed stages of a chapter.
+        """
+        return os.path.join(self.manifest_folder, f"Chapter{chapter_number}.json")
+    
+    def _run_stage(self, manifest, stage, params, input_stage, run, list_outputs=None):
+        """
+        Run one stage of process_chapter, or skip it if the manifest shows that
+        it already ran with the same settings and inputs.
+        
+        Args:
+            manifest: ChapterManifest of the chapter, or None to always run the stage
+            stage: Stage name, one of manifest.STAGES
+            params: Settings that change the outputs of the stage
+            input_stage: Stage whose outputs are the inputs of this one, or None
+            run: Callable running the stage and returning its result path
+            list_outputs: Callable listing the files produced, given the result
+                path (default: the result path is the only output)
+        
+        Returns:
+            Result path of the stage
+        """
+        if manifest is None:
+            with self.metrics.stage(stage):
+                return run()
         
-        # Task 5: Convert formatted PNGs to final PDF
-        final_pdf_path = self.formatted_pngs_to_pdf(formatted_folder, chapter_number)
+        if stage in manifest.reusable:
+            logger.info(f"Skipping stage '{stage}': settings and inputs unchanged since it completed")
+            return manifest.result(stage)
+        
+        inputs = manifest.fingerprint(input_stage) if input_stage else {}
+        if manifest.is_current(stage, params, inputs):
+            logger.info(f"Skipping stage '{stage}': inputs unchanged and outputs verified")
+            return manifest.result(stage)
+        
+        with self.metrics.stage(stage):
+            result = run()
+        output_paths = [] if result is None else (list_outputs or (lambda path: [path]))(result)
+        if output_paths:
+            # The input stage may have been recorded while this stage ran (pipelined)
+            inputs = manifest.fingerprint(input_stage) if input_stage else {}
+            manifest.record(stage, params, inputs, result, output_paths)
+        return result
+    
+    def final_pdf_settings(self, profiles=None):
+        """
+        Settings of the final PDF stage, per profile if profiles are given.
+        """
+        if not profiles:
+            return {**self.pdf_settings(), 'pdf_fast_web_view': self.pdf_fast_web_view}
+        return {'profiles': [{'name': profile['name'], **self.for_profile(profile).pdf_settings()}
+                             for profile in profiles],
+                'pdf_fast_web_view': self.pdf_fast_web_view}
+    
+    def _finish_chapter(self, formatted_folder, chapter_number, cleanup, manifest=None, profiles=None):
+        """
+        Task 5 and 6 of process_chapter: final PDF and cleanup.
+        
+        Returns:
+            Path to the final PDF, or with profiles a list of the final PDFs
+        """
+        if profiles:
+            # Task 5: One final PDF per profile, from the profile's slice folder
+            def write_final_pdfs():
+                return [self.for_profile(profile).formatted_pngs_to_pdf(folder, profile_chapter(chapter_number, profile))
+                        for profile, folder in zip(profiles, formatted_folder)]
+            
+            final_pdf_path = self._run_stage(manifest, 'final_pdf', self.final_pdf_settings(profiles), 'format',
+                                             write_final_pdfs, lambda paths: [path for path in paths if path])
+            
+            for profile, folder, path in zip(profiles, formatted_folder, final_pdf_path):
+                if path is not None:
+                    self.for_profile(profile).save_summary(profile_chapter(chapter_number, profile), folder, path)
+        else:
+            # Task 5: Convert formatted PNGs to final PDF
+            final_pdf_path = self._run_stage(
+                manifest, 'final_pdf', self.final_pdf_settings(), 'format',
+                lambda: self.formatted_pngs_to_pdf(formatted_folder, chapter_number))
+            
+            # Record formats and sizes while the slices are still there
+            if final_pdf_path is not None:
+                self.save_summary(chapter_number, formatted_folder, final_pdf_path)
         
         # Task 6: Clean up temporary files if requested
         if cleanup:
-            self.cleanup_temp_files(chapter_number)
+            with self.metrics.stage('cleanup'):
+                self.cleanup_temp_files(chapter_number, profiles=profiles)
         
-        print(f"Chapter {chapter_number} processing completed!")
+        logger.info(f"Chapter {chapter_number} processing completed!")
         return final_pdf_path
 
 